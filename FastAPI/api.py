@@ -1,30 +1,26 @@
-from fastapi import FastAPI, HTTPException, Query, Request, Depends
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Text, cast, text, func, select, insert, update, delete
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.util import await_only
 from dotenv import load_dotenv
-from pydantic import BaseModel, ValidationError
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from typing import List, Optional, Dict, Any, Literal
 import os
 import json
 import sys
+import base64
+import contextvars
+import functools
+import inspect
+from datetime import datetime
 import logging
 import traceback
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
-logger = logging.getLogger(__name__)
-
 # Add the FastAPI directory to the Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -32,26 +28,121 @@ if current_dir not in sys.path:
     sys.path.append(current_dir)
 sys.path.append(parent_dir)
 
+from FastAPI.logs import configure_logging, error_summary, logging_stats, parse_levels, stop_logging, truncated
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging. Handlers run on a background thread fed by a bounded
+# queue (LOG_QUEUE=false writes synchronously), and app.log is rotated
+configure_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    filename=os.getenv("LOG_FILE", "app.log") or None,
+    max_bytes=int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024))),
+    backups=int(os.getenv("LOG_FILE_BACKUPS", "5")),
+    use_queue=os.getenv("LOG_QUEUE", "true").lower() in ("1", "true", "yes"),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    # e.g. LOG_LEVELS="sqlalchemy.engine=INFO,FastAPI.api=DEBUG"
+    levels=parse_levels(os.getenv("LOG_LEVELS", "")),
+    payload_max_chars=int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+)
+logger = logging.getLogger(__name__)
+
 # Import our local modules
-from FastAPI.models import Feature as DBFeature
-from FastAPI.automatation.database import SessionLocal, engine
+from FastAPI.models import Feature as DBFeature, FeatureSimplified, DataVersion
+# Same module instance models.py imports Base from, so the app runs on a
+# single engine and connection pool
+from automatation.database import AsyncSessionLocal, SessionLocal, async_engine, engine, pool_status
+from FastAPI.spatial import (ENVELOPE_COLUMNS, envelope_columns, ensure_envelope_schema,
+                             ensure_geometry_objects, load_geometry, parse_bbox, validate_geometry)
+from FastAPI.serialization import orjson, record_json, record_list_json, stream_feature_collection
+from FastAPI.search import TrigramIndex, ensure_search_schema, postgres_search
+from FastAPI.simplification import ensure_simplified_levels, lod_for_zoom, simplified_levels, simplify_batch
+from FastAPI.tiles import MAX_ZOOM, TileCache, encode_tile, tile_bounds
+from FastAPI.bulk import bind_values, bulk_insert, bulk_update, reserve_ids
+from FastAPI.compression import CompressionMiddleware, ResponseCompression
+from FastAPI.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware, gauge_lines, phase, timed_iter
+from FastAPI.cache import CachedResponse, ResponseCache, etag_matches, http_date, list_scope, not_modified_since, version_etag
+
+# Request, SQL and serialization metrics for /metrics; the engines are
+# instrumented before their first query
+metrics = Metrics()
+metrics.instrument_engine(engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine)
 
 # Ensure tables are created
 try:
     DBFeature.__table__.create(bind=engine, checkfirst=True)
+    FeatureSimplified.__table__.create(bind=engine, checkfirst=True)
+    DataVersion.__table__.create(bind=engine, checkfirst=True)
+    ensure_geometry_objects(engine)
+    ensure_envelope_schema(engine)
+    ensure_simplified_levels(engine)
     logger.info("Database tables created successfully")
 except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
+    logger.error("Error creating database tables: %s", error_summary(e))
 
-# Load environment variables
-load_dotenv()
+# Postgres answers bbox queries from a GiST index; other databases use range
+# predicates on the B-tree envelope index
+USE_GIST_INDEX = engine.dialect.name == "postgresql"
+
+# Text search runs on pg_trgm indexes where the extension is available and
+# on an in-process trigram index otherwise. That index is rebuilt in the
+# background once more than SEARCH_INDEX_REBUILD_AFTER written features are
+# waiting to be folded into it.
+USE_TRIGRAM_INDEX = ensure_search_schema(engine)
+search_index = TrigramIndex(SessionLocal, rebuild_after=int(os.getenv("SEARCH_INDEX_REBUILD_AFTER", "5000")))
+
+# Encoded vector tiles, kept in memory and optionally on disk
+tile_cache = TileCache(
+    max_tiles=int(os.getenv("TILE_CACHE_SIZE", "2048")),
+    directory=os.getenv("TILE_CACHE_DIR") or None
+)
+# Most features encoded into one tile, largest envelopes first, so a low
+# zoom over dense data drops small features instead of encoding them all;
+# 0 means no cap
+TILE_MAX_FEATURES = int(os.getenv("TILE_MAX_FEATURES", "5000"))
+
+# Encoded /api/features responses; RESPONSE_CACHE_SIZE=0 turns it off
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+    version_check_interval=float(os.getenv("RESPONSE_CACHE_VERSION_CHECK", "5"))
+)
+# A data_version bump (an out-of-process load) also stales everything else
+# built from the features table in this process
+response_cache.on_version_change(tile_cache.clear)
+response_cache.on_version_change(search_index.invalidate)
+
+# Decimal places of coordinates in feature output unless a request asks for
+# ?precision= (6 is ~0.1 m). Unset or -1 serves coordinates exactly as
+# stored, without decoding and re-encoding the geometry.
+COORDINATE_PRECISION = int(os.getenv("COORDINATE_PRECISION", "") or -1)
+# ?precision= value meaning "as stored": doubles of coordinate magnitude carry
+# no more decimals than this, so rounding would only cost time
+FULL_PRECISION = 15
+
+def output_precision(precision: Optional[int]) -> Optional[int]:
+    """Decimal places to round coordinates to, or None to send them untouched."""
+    if precision is None:
+        precision = COORDINATE_PRECISION
+    return None if precision < 0 or precision >= FULL_PRECISION else precision
+
+# gzip/brotli for bodies of at least COMPRESSION_MIN_SIZE bytes
+compression = ResponseCompression(
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("BROTLI_QUALITY", "4"))
+)
 
 # Create FastAPI app
 app = FastAPI(
     title="Karnataka Geospatial API", 
     description="API for managing Karnataka geospatial data",
     docs_url="/docs",  # OpenAPI documentation
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # Add CORS middleware
@@ -61,19 +152,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag", "Last-Modified"],
 )
 
+# Compress whatever the endpoints haven't already compressed themselves
+app.add_middleware(CompressionMiddleware, compression=compression)
+
+# Outermost, so latency covers compression and sizes are bytes as sent
+app.add_middleware(MetricsMiddleware, metrics=metrics, routes=lambda: {
+    getattr(route, "endpoint", None) or getattr(route, "app", None): route.path for route in app.routes
+})
+
 # Pydantic model for feature creation
 class FeatureCreate(BaseModel):
     name: str
     description: Optional[str] = None
     geometry: Dict[str, Any]  # GeoJSON geometry
 
+    # Malformed coordinates are a 422 here rather than an error halfway
+    # through computing the envelope
+    _check_geometry = field_validator("geometry")(validate_geometry)
+
+# Pydantic models for batch edits
+BATCH_MAX_OPERATIONS = 10000
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    feature: Optional[FeatureCreate] = None
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op in ("update", "delete") and self.id is None:
+            raise ValueError(f"{self.op} requires an id")
+        if self.op in ("create", "update") and self.feature is None:
+            raise ValueError(f"{self.op} requires a feature")
+        return self
+
+class FeatureBatch(BaseModel):
+    operations: List[BatchOperation] = Field(..., max_length=BATCH_MAX_OPERATIONS)
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        # Updates and deletes are applied as set-based statements, so two
+        # operations on one id have no defined order
+        seen = set()
+        for index, operation in enumerate(self.operations):
+            if operation.id is None:
+                continue
+            if operation.id in seen:
+                raise ValueError(f"operation {index} repeats id {operation.id}; send one operation per feature")
+            seen.add(operation.id)
+        return self
+
 # Mount static files with absolute path
 static_path = os.path.join(parent_dir, "static")
-logger.info(f"Static files path: {static_path}")
-logger.info(f"Static path exists: {os.path.exists(static_path)}")
-logger.info(f"Static path contents: {os.listdir(static_path)}")
+logger.info("Static files path: %s", static_path)
+logger.info("Static path exists: %s", os.path.exists(static_path))
+logger.info("Static path contents: %s", os.listdir(static_path))
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 
 # Favicon handler
@@ -84,27 +220,230 @@ async def favicon():
         return FileResponse(favicon_path)
     raise HTTPException(status_code=404)
 
-# Database session dependency
-def get_db():
+# Keyset pagination cursors
+def encode_cursor(last_id: int) -> str:
+    """Encode the last seen feature id as an opaque pagination cursor."""
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_cursor back into a feature id."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError("cursor id must be an integer")
+        return last_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Spatial filtering
+def filter_bbox(query, bbox):
+    """Restrict a feature query to envelopes intersecting bbox."""
+    if USE_GIST_INDEX:
+        feature_box = func.box(
+            func.point(DBFeature.min_x, DBFeature.min_y),
+            func.point(DBFeature.max_x, DBFeature.max_y)
+        )
+        query_box = func.box(func.point(bbox[0], bbox[1]), func.point(bbox[2], bbox[3]))
+        return query.filter(feature_box.op("&&")(query_box))
+    return query.filter(
+        DBFeature.min_x <= bbox[2], DBFeature.max_x >= bbox[0],
+        DBFeature.min_y <= bbox[3], DBFeature.max_y >= bbox[1]
+    )
+
+def feature_envelope(row):
+    """Envelope of a result row or envelope_columns() dict, or None if it has none."""
+    columns = row if isinstance(row, dict) else row._mapping
+    if columns["min_x"] is None:
+        return None
+    return tuple(columns[c] for c in ENVELOPE_COLUMNS)
+
+def invalidate_spatial_caches(ids, *envelopes):
+    """Drop derived spatial data touched by a write to these features and envelopes.
+
+    The in-process search index searches the written ids from the table
+    until its next rebuild; every write goes through here.
+    """
+    search_index.invalidate(ids)
+    envelopes = [e for e in envelopes if e is not None]
+    if len(envelopes) > 64:
+        # Large batches: one pass over the cache with the combined extent
+        # beats one pass per feature, at the cost of evicting a bit more
+        envelopes = [(
+            min(e[0] for e in envelopes), min(e[1] for e in envelopes),
+            max(e[2] for e in envelopes), max(e[3] for e in envelopes)
+        )]
+    for envelope in envelopes:
+        tile_cache.invalidate(envelope)
+
+# Level-of-detail geometry
+def store_simplified_levels(db: Session, feature_id: int, geometry: Dict[str, Any], replace: bool = True):
+    """Write the precomputed simplified geometries of a feature."""
+    if replace:
+        db.execute(delete(FeatureSimplified).where(FeatureSimplified.feature_id == feature_id))
+    bulk_insert(db, FeatureSimplified, [
+        {"feature_id": feature_id, "level": level, "geometry": simplified}
+        for level, simplified in offload(simplified_levels, geometry).items()
+    ])
+
+def update_feature_row(db: Session, feature_id: int, values: Dict[str, Any]):
+    """UPDATE one feature, returning its envelope columns from before the write.
+
+    Returns None when no row has that id. On Postgres the old envelope comes
+    back from the UPDATE itself through a self-join; elsewhere RETURNING only
+    sees new values, so the four envelope columns are read first.
+    """
+    envelope = (DBFeature.min_x, DBFeature.min_y, DBFeature.max_x, DBFeature.max_y)
+    if engine.dialect.name == "postgresql":
+        old = select(DBFeature.id, *envelope).where(DBFeature.id == feature_id).subquery("old")
+        return db.execute(
+            update(DBFeature).where(DBFeature.id == old.c.id).values(values)
+            .returning(old.c.min_x, old.c.min_y, old.c.max_x, old.c.max_y)
+        ).first()
+    row = db.execute(select(*envelope).where(DBFeature.id == feature_id)).first()
+    if row is None:
+        return None
+    result = db.execute(update(DBFeature).where(DBFeature.id == feature_id).values(values))
+    return row if result.rowcount else None
+
+# Geometry as the stored JSON text, which responses splice in without
+# decoding; selecting the column itself lets the driver decode it
+GEOMETRY_TEXT = cast(DBFeature.geometry, Text).label("geometry")
+
+def feature_rows_query(db: Session, level: Optional[int]):
+    """Query (id, name, description, geometry) rows at the given detail level.
+
+    The simplified geometry is selected instead of the full one, so coarse
+    zooms don't pull full-resolution polygons out of the database at all.
+    """
+    columns = (DBFeature.id, DBFeature.name, DBFeature.description)
+    if level is None:
+        return db.query(*columns, GEOMETRY_TEXT)
+    return db.query(*columns, FeatureSimplified.geometry).outerjoin(
+        FeatureSimplified,
+        (FeatureSimplified.feature_id == DBFeature.id) & (FeatureSimplified.level == level)
+    )
+
+def fill_full_geometry(db: Session, rows):
+    """Fall back to full geometry for rows without a simplified version.
+
+    Columns after the geometry (e.g. updated_at) are passed through.
+    """
+    missing = [row.id for row in rows if row.geometry is None]
+    if not missing:
+        return rows
+    full = dict(db.query(DBFeature.id, GEOMETRY_TEXT).filter(DBFeature.id.in_(missing)))
+    return [
+        (row.id, row.name, row.description, full[row.id] if row.geometry is None else row.geometry, *row[4:])
+        for row in rows
+    ]
+
+# Conditional GET: clients may keep responses but must revalidate them, which
+# costs a 304 and an (id, updated_at) lookup instead of a full body
+REVALIDATE_HEADERS = {"Cache-Control": "no-cache"}
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def cached_response(cached: CachedResponse, accept_encoding: Optional[str]) -> Response:
+    """Send a cached body, compressed if the client accepts it.
+
+    Each content coding is compressed once per cache entry and kept next
+    to the body, so repeat hits cost no compression at all.
+    """
+    encoding = compression.negotiate(accept_encoding, len(cached.body))
+    if encoding is None:
+        return Response(content=cached.body, media_type="application/json",
+                        headers={**cached.headers, "Vary": "Accept-Encoding"})
+    body = cached.encoded.get(encoding)
+    if body is None:
+        body = cached.encoded[encoding] = compression.compress(cached.body, encoding)
+    return Response(content=body, media_type="application/json",
+                    headers=compression.encoded_headers(cached.headers, encoding))
+
+# Database sessions
+def _run_with_session(fn):
     db = SessionLocal()
     try:
-        yield db
+        return fn(db)
     except Exception as e:
-        logger.error(f"Database session error: {e}")
+        if not isinstance(e, HTTPException):
+            logger.error("Database session error: %s", error_summary(e))
         raise
     finally:
         db.close()
 
+async def run_db(fn):
+    """Run fn(session) without blocking the event loop.
+
+    With DB_ASYNC on, fn runs under AsyncSession.run_sync(): its queries go
+    through the async driver and yield to other requests while they wait.
+    The rest of fn runs on the event loop, so CPU-heavy steps in it go
+    through offload(). Otherwise it gets a SessionLocal session in the
+    thread pool.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn)
+    return await run_in_threadpool(_run_with_session, fn)
+
+def offload(fn, *args, **kwargs):
+    """Call CPU-bound fn(*args, **kwargs) from a db_endpoint handler.
+
+    Under DB_ASYNC the handler runs on the event loop, so fn goes to the
+    thread pool and the loop serves other requests until it returns.
+    Otherwise the handler is already in the pool and fn is called directly.
+    fn must not use the session.
+    """
+    if AsyncSessionLocal is None:
+        return fn(*args, **kwargs)
+    # In the request's context, so phase() timings still count
+    return await_only(run_in_threadpool(contextvars.copy_context().run, fn, *args, **kwargs))
+
+def db_endpoint(func):
+    """Turn a handler that takes a Session as `db` into an async endpoint.
+
+    The handler body stays plain synchronous SQLAlchemy code and is run
+    through run_db(); `db` is dropped from the signature FastAPI sees.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def endpoint(**kwargs):
+        return await run_db(lambda session: func(db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(
+        parameters=[p for name, p in signature.parameters.items() if name != "db"]
+    )
+    return endpoint
+
+@app.on_event("startup")
+def build_search_index():
+    # Built in the background so the first search doesn't pay for it
+    if not USE_TRIGRAM_INDEX:
+        search_index.start()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    # asyncpg connections must be closed on the loop that opened them
+    if async_engine is not None:
+        await async_engine.dispose()
+
+@app.on_event("shutdown")
+def flush_logs():
+    stop_logging()
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}")
-    logger.error(traceback.format_exc())
+    # The stack without format_exc()'s last line, which repeats str(exc)
+    logger.error("Unhandled exception: %s\n%s", error_summary(exc), "".join(traceback.format_tb(exc.__traceback__)))
     return JSONResponse(
         status_code=500,
         content={
             "message": "Internal Server Error",
-            "error": str(exc)
+            "error": error_summary(exc)
         }
     )
 
@@ -114,126 +453,515 @@ async def root(request: Request):
     # Explicitly define the index.html path
     index_path = os.path.join(static_path, "index.html")
     
-    # Detailed logging
-    logger.info(f"Attempting to serve index.html from: {index_path}")
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info(f"Python path: {sys.path}")
-    
     # Check if the file exists with absolute path
     if not os.path.exists(index_path):
-        logger.error(f"Index file not found at: {index_path}")
+        logger.error("Index file not found at: %s", index_path)
         raise HTTPException(status_code=404, detail=f"Index file not found at {index_path}")
     
     # Serve the file
     try:
         return FileResponse(index_path)
     except Exception as e:
-        logger.error(f"Error serving index.html: {e}")
+        logger.error("Error serving index.html: %s", error_summary(e))
         raise HTTPException(status_code=500, detail=f"Error serving index.html: {str(e)}")
 
 # API Endpoints
 @app.post("/api/features/", response_model=Dict[str, Any])
-async def create_feature(feature: FeatureCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_feature(db: Session, feature: FeatureCreate):
     try:
-        logger.info(f"Creating feature: {feature}")
-        db_feature = DBFeature(
-            name=feature.name,
-            description=feature.description,
-            geometry=json.dumps(feature.geometry)
-        )
-        db.add(db_feature)
+        # Lazy %-formatting: nothing is rendered unless DEBUG is on
+        logger.debug("Creating feature: %s", truncated(feature))
+        envelope = envelope_columns(feature.geometry)
+        feature_id = db.execute(
+            insert(DBFeature).values(
+                name=feature.name,
+                description=feature.description,
+                geometry=feature.geometry,
+                **envelope
+            ).returning(DBFeature.id)
+        ).scalar_one()
+        store_simplified_levels(db, feature_id, feature.geometry, replace=False)
         db.commit()
-        db.refresh(db_feature)
-        return {"message": "Feature created successfully", "id": db_feature.id}
+        invalidate_spatial_caches([feature_id], feature_envelope(envelope))
+        response_cache.invalidate(feature_id, feature_envelope(envelope))
+        return {"message": "Feature created successfully", "id": feature_id}
     except ValidationError as ve:
-        logger.error(f"Validation error: {ve}")
-        raise HTTPException(status_code=422, detail=str(ve))
+        logger.error("Validation error: %s", error_summary(ve))
+        raise HTTPException(status_code=422, detail=error_summary(ve))
     except SQLAlchemyError as se:
-        logger.error(f"Database error: {se}")
+        logger.error("Database error: %s", error_summary(se))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", error_summary(e))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=error_summary(e))
+
+@app.post("/api/features/batch", response_model=Dict[str, Any])
+@db_endpoint
+def batch_features(db: Session, batch: FeatureBatch):
+    """Apply many create/update/delete operations in one transaction.
+
+    Operations are applied as bulk statements: all creates, then all
+    updates, then all deletes. Each item gets a result in request order;
+    updates and deletes of unknown ids are reported as not_found.
+    """
+    operations = batch.operations
+    results: List[Dict[str, Any]] = [{"index": i, "op": op.op, "id": op.id} for i, op in enumerate(operations)]
+    creates = [i for i, op in enumerate(operations) if op.op == "create"]
+    updates = [i for i, op in enumerate(operations) if op.op == "update"]
+    deletes = [i for i, op in enumerate(operations) if op.op == "delete"]
+
+    try:
+        # One lookup for every id we touch: existence and old envelopes
+        target_ids = {operations[i].id for i in updates + deletes}
+        old_envelopes = {}
+        if target_ids:
+            rows = db.execute(
+                select(DBFeature.id, DBFeature.min_x, DBFeature.min_y, DBFeature.max_x, DBFeature.max_y)
+                .where(DBFeature.id.in_(target_ids))
+            )
+            old_envelopes = {row[0]: (None if row[1] is None else tuple(row[1:])) for row in rows}
+
+        now = datetime.utcnow()
+        written = creates + [i for i in updates if operations[i].id in old_envelopes]
+        geometry_texts = {i: json.dumps(operations[i].feature.geometry) for i in written}
+        envelopes = {i: envelope_columns(operations[i].feature.geometry) for i in written}
+        levels = dict(zip(written, offload(simplify_batch, [geometry_texts[i] for i in written])))
+
+        def row_values(i):
+            feature = operations[i].feature
+            return {
+                "name": feature.name,
+                "description": feature.description,
+                "geometry": geometry_texts[i],
+                "updated_at": now,
+                **envelopes[i]
+            }
+
+        if creates:
+            rows = [{**row_values(i), "created_at": now} for i in creates]
+            if engine.dialect.name == "postgresql":
+                # Reserve ids up front so the rows can go in with COPY
+                new_ids = reserve_ids(db, "features", len(rows))
+                bulk_insert(db, DBFeature, [{"id": new_id, **row} for new_id, row in zip(new_ids, rows)])
+            else:
+                new_ids = db.execute(
+                    insert(DBFeature).values(bind_values(DBFeature.__table__, list(rows[0])))
+                    .returning(DBFeature.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+            for i, new_id in zip(creates, new_ids):
+                results[i].update(id=new_id, status="created")
+
+        found_updates = written[len(creates):]
+        if found_updates:
+            bulk_update(db, DBFeature, [{"id": operations[i].id, **row_values(i)} for i in found_updates])
+            for i in found_updates:
+                results[i]["status"] = "updated"
+
+        found_deletes = [i for i in deletes if operations[i].id in old_envelopes]
+        if found_deletes:
+            db.execute(delete(DBFeature).where(DBFeature.id.in_({operations[i].id for i in found_deletes})))
+            for i in found_deletes:
+                results[i]["status"] = "deleted"
+
+        for i in updates + deletes:
+            results[i].setdefault("status", "not_found")
+
+        # Rewrite simplified levels for everything created or updated
+        stale_ids = {operations[i].id for i in found_updates + found_deletes}
+        if stale_ids:
+            db.execute(delete(FeatureSimplified).where(FeatureSimplified.feature_id.in_(stale_ids)))
+        deleted_ids = {operations[i].id for i in found_deletes}
+        simplified_rows = [
+            {"feature_id": results[i]["id"], "level": level, "geometry": geometry_text}
+            for i in written
+            if results[i]["id"] not in deleted_ids
+            for level, geometry_text in levels[i].items()
+        ]
+        bulk_insert(db, FeatureSimplified, simplified_rows)
+
+        db.commit()
+    except SQLAlchemyError as se:
+        logger.error("Database error in batch: %s", error_summary(se))
+        db.rollback()
+        # A constraint violation is a conflict with existing data, not a server fault
+        raise HTTPException(status_code=409 if isinstance(se, IntegrityError) else 500, detail=error_summary(se))
+
+    new_envelopes = {results[i]["id"]: feature_envelope(envelopes[i]) for i in written}
+    touched_ids = set(old_envelopes) | set(new_envelopes)
+    invalidate_spatial_caches(touched_ids, *old_envelopes.values(), *new_envelopes.values())
+    if len(touched_ids) > 64:
+        response_cache.clear()
+    else:
+        for feature_id in touched_ids:
+            response_cache.invalidate(feature_id, old_envelopes.get(feature_id), new_envelopes.get(feature_id))
+    logger.info("Batch applied: %s creates, %s updates, %s deletes",
+                len(creates), len(found_updates), len(found_deletes))
+    return {"message": "Batch applied successfully", "results": results}
 
 @app.get("/api/features/", response_model=List[Dict[str, Any]])
-async def get_features(
+@db_endpoint
+def get_features(
+    db: Session,
     limit: int = Query(50, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    after_id: Optional[int] = Query(None, ge=0, description="Return features with id greater than this"),
+    bbox: Optional[str] = Query(None, description="Only features intersecting minx,miny,maxx,maxy"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom level; returns simplified geometry"),
+    precision: Optional[int] = Query(None, ge=0, le=FULL_PRECISION,
+                                     description="Decimal places for coordinates; 15 sends them as stored"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
 ):
+    # Keyset mode seeks on the primary key index, so deep pages cost the same
+    # as the first one. OFFSET is kept for existing clients.
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+    precision = output_precision(precision)
+    if bbox is not None:
+        try:
+            bbox = parse_bbox(bbox)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=f"Invalid bbox: {ve}")
+
     try:
-        features = db.query(DBFeature).offset(offset).limit(limit).all()
-        return [
-            {
-                "id": f.id,
-                "name": f.name,
-                "description": f.description,
-                "geometry": json.loads(f.geometry)
-            }
-            for f in features
-        ]
+        response_cache.check_version(db)
+        key = ("list", limit, offset if after_id is None else None, after_id, bbox, zoom, precision)
+        cached = response_cache.get(key)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.headers["ETag"]):
+                return not_modified(cached.headers)
+            return cached_response(cached, accept_encoding)
+        generation = response_cache.generation
+
+        def page(query):
+            query = query.order_by(DBFeature.id)
+            if bbox is not None:
+                query = filter_bbox(query, bbox)
+            if after_id is not None:
+                query = query.filter(DBFeature.id > after_id)
+            else:
+                query = query.offset(offset)
+            # Fetch one extra row to know whether another page exists
+            rows = query.limit(limit + 1).all()
+            return rows[:limit], len(rows) > limit
+
+        if if_none_match is not None:
+            # Check the client's copy against ids and timestamps alone
+            versions, has_more = page(db.query(DBFeature.id, DBFeature.updated_at))
+            etag = version_etag(versions, has_more, precision, lod_for_zoom(zoom))
+            if etag_matches(if_none_match, etag):
+                headers = {"ETag": etag, **REVALIDATE_HEADERS}
+                if has_more:
+                    headers["X-Next-Cursor"] = encode_cursor(versions[-1].id)
+                return not_modified(headers)
+
+        features, has_more = page(feature_rows_query(db, lod_for_zoom(zoom)).add_columns(DBFeature.updated_at))
+        versions = [(f.id, f.updated_at) for f in features]
+        headers = {"ETag": version_etag(versions, has_more, precision, lod_for_zoom(zoom)), **REVALIDATE_HEADERS}
+        if has_more:
+            headers["X-Next-Cursor"] = encode_cursor(features[-1].id)
+        # Stored geometry text is spliced into the body as-is instead of
+        # being decoded and walked again by the response encoder
+        features = fill_full_geometry(db, features)
+        with phase("encode"):
+            body = offload(record_list_json, [row[:4] for row in features], precision)
+        scope = list_scope(after_id, features[-1][0] if features else None, has_more, bbox)
+        cached = CachedResponse(body, headers)
+        response_cache.put(key, cached, scope, generation)
+        return cached_response(cached, accept_encoding)
     except SQLAlchemyError as se:
-        logger.error(f"Database error: {se}")
-        raise HTTPException(status_code=500, detail=str(se))
+        logger.error("Database error: %s", error_summary(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error("Unexpected error: %s", error_summary(e))
+        raise HTTPException(status_code=500, detail=error_summary(e))
+
+@app.get("/api/features/search", response_model=List[Dict[str, Any]])
+@db_endpoint
+def search_features(
+    db: Session,
+    q: str = Query(..., min_length=1, max_length=200, description="Text to look for in names and descriptions"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom level; returns simplified geometry"),
+    precision: Optional[int] = Query(None, ge=0, le=FULL_PRECISION,
+                                     description="Decimal places for coordinates; 15 sends them as stored"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """Features whose name or description matches q, best match first.
+
+    Name prefix matches rank first, then substring matches in the name and
+    then in the description, then fuzzy (trigram similarity) matches.
+    X-Next-Offset is set when there are more results.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search text must not be blank")
+    precision = output_precision(precision)
+
+    try:
+        response_cache.check_version(db)
+        key = ("search", q, limit, offset, zoom, precision)
+        cached = response_cache.get(key)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.headers["ETag"]):
+                return not_modified(cached.headers)
+            return cached_response(cached, accept_encoding)
+        generation = response_cache.generation
+
+        # One extra id tells whether another page exists
+        if USE_TRIGRAM_INDEX:
+            ids = postgres_search(db, q, limit + 1, offset)
+        else:
+            ids = offload(search_index.query, q, limit + 1, offset)
+        has_more = len(ids) > limit
+        ids = ids[:limit]
+
+        rows = feature_rows_query(db, lod_for_zoom(zoom)).add_columns(DBFeature.updated_at) \
+            .filter(DBFeature.id.in_(ids)).all()
+        rank = {feature_id: i for i, feature_id in enumerate(ids)}
+        rows.sort(key=lambda row: rank[row.id])
+        versions = [(r.id, r.updated_at) for r in rows]
+        headers = {"ETag": version_etag(versions, has_more, precision, lod_for_zoom(zoom)), **REVALIDATE_HEADERS}
+        if has_more:
+            headers["X-Next-Offset"] = str(offset + limit)
+        if etag_matches(if_none_match, headers["ETag"]):
+            return not_modified(headers)
+        rows = fill_full_geometry(db, rows)
+        with phase("encode"):
+            body = offload(record_list_json, [row[:4] for row in rows], precision)
+        cached = CachedResponse(body, headers)
+        # Any write can change what matches, so the whole table is in scope
+        response_cache.put(key, cached, list_scope(None, None, False, None), generation)
+        return cached_response(cached, accept_encoding)
+    except SQLAlchemyError as se:
+        logger.error("Database error: %s", error_summary(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
+
+@app.get("/api/features.geojson")
+async def export_features(
+    chunk_size: int = Query(500, ge=1, le=10000),
+    precision: Optional[int] = Query(None, ge=0, le=FULL_PRECISION,
+                                     description="Decimal places for coordinates; 15 sends them as stored"),
+    delta: bool = Query(False, description="Delta-encode coordinates as integers (see the quantization member)")
+):
+    """Stream every feature as a single GeoJSON FeatureCollection."""
+    precision = output_precision(precision)
+    if delta and precision is None:
+        raise HTTPException(status_code=400, detail="delta encoding needs a precision")
+
+    def generate():
+        # The session lives as long as the stream, not the request handler
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(DBFeature.id, DBFeature.name, DBFeature.description, GEOMETRY_TEXT)
+                .order_by(DBFeature.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            # Fetching the next rows counts as db time, the rest as encoding
+            yield from timed_iter(
+                stream_feature_collection(timed_iter(rows, "db"), chunk_size, precision, delta), "encode"
+            )
+        except SQLAlchemyError as se:
+            # Headers are already sent, so the best we can do is log and cut the stream
+            logger.error("Database error during export: %s", error_summary(se))
+            raise
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/geo+json",
+        headers={"Content-Disposition": 'attachment; filename="features.geojson"'}
+    )
 
 @app.get("/api/features/{feature_id}", response_model=Dict[str, Any])
-async def get_feature(feature_id: int, db: Session = Depends(get_db)):
-    feature = db.query(DBFeature).filter(DBFeature.id == feature_id).first()
+@db_endpoint
+def get_feature(
+    db: Session,
+    feature_id: int,
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom level; returns simplified geometry"),
+    precision: Optional[int] = Query(None, ge=0, le=FULL_PRECISION,
+                                     description="Decimal places for coordinates; 15 sends them as stored"),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    precision = output_precision(precision)
+
+    def validators(updated_at):
+        headers = {"ETag": version_etag([(feature_id, updated_at)], precision, lod_for_zoom(zoom)), **REVALIDATE_HEADERS}
+        if updated_at is not None:
+            headers["Last-Modified"] = http_date(updated_at)
+        return headers
+
+    def is_fresh(headers):
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if if_none_match is not None:
+            return etag_matches(if_none_match, headers["ETag"])
+        return not_modified_since(if_modified_since, headers.get("Last-Modified"))
+
+    response_cache.check_version(db)
+    key = ("feature", feature_id, zoom, precision)
+    cached = response_cache.get(key)
+    if cached is not None:
+        if is_fresh(cached.headers):
+            return not_modified(cached.headers)
+        return cached_response(cached, accept_encoding)
+    generation = response_cache.generation
+
+    if if_none_match is not None or if_modified_since is not None:
+        updated_at = db.execute(select(DBFeature.updated_at).where(DBFeature.id == feature_id)).first()
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Feature not found")
+        headers = validators(updated_at[0])
+        if is_fresh(headers):
+            return not_modified(headers)
+
+    feature = feature_rows_query(db, lod_for_zoom(zoom)).add_columns(DBFeature.updated_at) \
+        .filter(DBFeature.id == feature_id).first()
     if not feature:
         raise HTTPException(status_code=404, detail="Feature not found")
-    return {
-        "id": feature.id,
-        "name": feature.name,
-        "description": feature.description,
-        "geometry": json.loads(feature.geometry)
-    }
+    headers = validators(feature.updated_at)
+    feature = fill_full_geometry(db, [feature])[0]
+    with phase("encode"):
+        body = record_json(*feature[:4], precision=precision).encode()
+    cached = CachedResponse(body, headers)
+    response_cache.put(key, cached, feature_id, generation)
+    return cached_response(cached, accept_encoding)
 
 @app.put("/api/features/{feature_id}", response_model=Dict[str, Any])
-async def update_feature(
+@db_endpoint
+def update_feature(
+    db: Session,
     feature_id: int,
-    feature: FeatureCreate,
-    db: Session = Depends(get_db)
+    feature: FeatureCreate
 ):
-    db_feature = db.query(DBFeature).filter(DBFeature.id == feature_id).first()
-    if not db_feature:
-        raise HTTPException(status_code=404, detail="Feature not found")
-    
     try:
-        db_feature.name = feature.name
-        db_feature.description = feature.description
-        db_feature.geometry = json.dumps(feature.geometry)
+        envelope = envelope_columns(feature.geometry)
+        old = update_feature_row(db, feature_id, {
+            "name": feature.name,
+            "description": feature.description,
+            "geometry": feature.geometry,
+            **envelope
+        })
+        if old is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Feature not found")
+        store_simplified_levels(db, feature_id, feature.geometry)
         db.commit()
-        db.refresh(db_feature)
+        invalidate_spatial_caches([feature_id], feature_envelope(old), feature_envelope(envelope))
+        response_cache.invalidate(feature_id, feature_envelope(old), feature_envelope(envelope))
         return {"message": "Feature updated successfully"}
+    except HTTPException:
+        raise
     except SQLAlchemyError as se:
-        logger.error(f"Database error: {se}")
+        logger.error("Database error: %s", error_summary(se))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", error_summary(e))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=error_summary(e))
 
 @app.delete("/api/features/{feature_id}")
-async def delete_feature(feature_id: int, db: Session = Depends(get_db)):
-    db_feature = db.query(DBFeature).filter(DBFeature.id == feature_id).first()
-    if not db_feature:
-        raise HTTPException(status_code=404, detail="Feature not found")
-    
+@db_endpoint
+def delete_feature(db: Session, feature_id: int):
     try:
-        db.delete(db_feature)
+        old = db.execute(
+            delete(DBFeature).where(DBFeature.id == feature_id)
+            .returning(DBFeature.id, DBFeature.min_x, DBFeature.min_y, DBFeature.max_x, DBFeature.max_y)
+        ).first()
+        if old is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Feature not found")
+        if engine.dialect.name != "postgresql":
+            # Postgres drops the levels through ON DELETE CASCADE
+            db.execute(delete(FeatureSimplified).where(FeatureSimplified.feature_id == feature_id))
         db.commit()
+        invalidate_spatial_caches([feature_id], feature_envelope(old))
+        response_cache.invalidate(feature_id, feature_envelope(old))
         return {"message": "Feature deleted successfully"}
+    except HTTPException:
+        raise
     except SQLAlchemyError as se:
-        logger.error(f"Database error: {se}")
+        logger.error("Database error: %s", error_summary(se))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", error_summary(e))
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_summary(e))
+
+@app.get("/api/pool")
+async def get_pool_status():
+    """Connection pool occupancy and checkout wait times, for sizing the pool."""
+    return pool_status()
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    """Response cache size and hit/miss counters."""
+    return response_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics: per-route latency and size, SQL and serialization timings."""
+    return Response(content=metrics.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+def _state_metrics():
+    """Pool and response cache counters as gauges."""
+    status = pool_status()
+    pools = [("sync", status)] + ([("async", status["async"])] if "async" in status else [])
+    for key, value in status.items():
+        if isinstance(value, (int, float)):
+            yield from gauge_lines(f"db_pool_{key}", f"Connection pool {key.replace('_', ' ')}.",
+                                   [({"pool": name}, pool[key]) for name, pool in pools])
+    for key, value in response_cache.stats().items():
+        yield from gauge_lines(f"response_cache_{key}", f"Response cache {key.replace('_', ' ')}.", [({}, value)])
+    for key, value in logging_stats().items():
+        yield from gauge_lines(f"log_records_{key}", f"Log records {key}.", [({}, value)])
+
+metrics.collectors.append(_state_metrics)
+
+@app.get("/tiles/{z}/{x}/{y}.pbf")
+@db_endpoint
+def get_tile(db: Session, z: int, x: int, y: int):
+    """Mapbox Vector Tile of the features layer for one web mercator tile."""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    try:
+        # Loads from other processes bump data_version; tiles are dropped then
+        response_cache.check_version(db)
+    except SQLAlchemyError as se:
+        logger.error("Database error: %s", error_summary(se))
+        raise HTTPException(status_code=500, detail=error_summary(se))
+
+    tile = tile_cache.get(z, x, y)
+    if tile is None:
+        try:
+            area = (DBFeature.max_x - DBFeature.min_x) * (DBFeature.max_y - DBFeature.min_y)
+            query = feature_rows_query(db, lod_for_zoom(z)).order_by(area.desc(), DBFeature.id)
+            query = filter_bbox(query, tile_bounds(z, x, y))
+            if TILE_MAX_FEATURES > 0:
+                query = query.limit(TILE_MAX_FEATURES)
+            rows = fill_full_geometry(db, query.all())
+
+            def encode():
+                with phase("decode"):
+                    features = [(i, n, d, load_geometry(g)) for i, n, d, g in rows]
+                with phase("encode"):
+                    return encode_tile(z, x, y, features)
+
+            tile = offload(encode)
+            tile_cache.put(z, x, y, tile)
+        except SQLAlchemyError as se:
+            logger.error("Database error: %s", error_summary(se))
+            raise HTTPException(status_code=500, detail=error_summary(se))
+
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
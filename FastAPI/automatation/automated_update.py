@@ -1,107 +1,439 @@
-import os
-import sys
-import logging
-from datetime import datetime
-from data_ingestion import process_and_store_data
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('geojson_update.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-def check_for_updates(engine, table_name, new_data_count):
-    """Compare the current data count with new data count"""
-    try:
-        with engine.connect() as connection:
-            result = connection.execute(
-                text(f"SELECT COUNT(*) FROM {table_name}")
-            ).scalar()
-            return result != new_data_count
-    except Exception as e:
-        logging.error(f"Error checking for updates: {e}")
-        return True
-
-def backup_table(engine, table_name):
-    """Create a backup of the current table"""
-    backup_name = f"{table_name}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    try:
-        with engine.connect() as connection:
-            connection.execute(
-                text(f"CREATE TABLE {backup_name} AS SELECT * FROM {table_name}")
-            )
-        logging.info(f"Created backup table: {backup_name}")
-        return True
-    except Exception as e:
-        logging.error(f"Error creating backup: {e}")
-        return False
-
-def main():
-    """Main function to run the automated update"""
-    try:
-        # Load environment variables
-        load_dotenv()
-        
-        # Configuration
-        geojson_url = "https://raw.githubusercontent.com/datasets/geo-countries/master/data/countries.geojson"
-        table_name = "countries"
-        
-        logging.info("Starting automated update process")
-        
-        # Create database engine
-        db_params = {
-            'host': os.getenv('DB_HOST'),
-            'port': os.getenv('DB_PORT'),
-            'database': os.getenv('DB_NAME'),
-            'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD')
-        }
-        engine = create_engine(
-            f"postgresql://{db_params['user']}:{db_params['password']}@"
-            f"{db_params['host']}:{db_params['port']}/{db_params['database']}"
-        )
-        
-        # Process the new data
-        success = process_and_store_data(geojson_url, f"{table_name}_temp")
-        
-        if success:
-            # Check if there are any changes
-            with engine.connect() as connection:
-                new_count = connection.execute(
-                    text(f"SELECT COUNT(*) FROM {table_name}_temp")
-                ).scalar()
-            
-            if check_for_updates(engine, table_name, new_count):
-                logging.info("Changes detected in the data")
-                
-                # Create backup
-                if backup_table(engine, table_name):
-                    # Replace the old table with the new one
-                    with engine.connect() as connection:
-                        connection.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
-                        connection.execute(
-                            text(f"ALTER TABLE {table_name}_temp RENAME TO {table_name}")
-                        )
-                    logging.info("Successfully updated the data")
-                else:
-                    logging.error("Failed to create backup, update aborted")
-            else:
-                logging.info("No changes detected in the data")
-                # Clean up temporary table
-                with engine.connect() as connection:
-                    connection.execute(text(f"DROP TABLE IF EXISTS {table_name}_temp"))
-        else:
-            logging.error("Failed to process and store new data")
-            
-    except Exception as e:
-        logging.error(f"Error in automated update: {e}")
-        raise
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import argparse
+import os
+import sys
+import logging
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from dotenv import load_dotenv
+
+# data_ingestion lives in scrips/ at the repository root
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+scripts_dir = os.path.join(root_dir, "scrips")
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+
+from data_ingestion import GEOMETRY_COLUMN, HASH_COLUMN, process_and_store_data, quote_identifier
+
+# Number of updates that can be rolled back; older history is pruned
+RETENTION = int(os.getenv("UPDATE_RETENTION", "5"))
+# Property indexed for lookups by name, if the source has it
+NAME_COLUMN = os.getenv("UPDATE_NAME_COLUMN", "name")
+# How long the update waits for a lock on the live table before it backs
+# off; readers queue behind a waiting ALTER TABLE, so this stays short
+LOCK_TIMEOUT = os.getenv("UPDATE_LOCK_TIMEOUT", "5s")
+LOCK_RETRIES = int(os.getenv("UPDATE_LOCK_RETRIES", "5"))
+LOCK_NOT_AVAILABLE = "55P03"
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('geojson_update.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+def table_columns(connection, table_name):
+    """Column names and SQL types of table_name, in order; empty if it doesn't exist."""
+    rows = connection.execute(text(
+        "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped "
+        "ORDER BY attnum"
+    ), {"table": quote_identifier(table_name)})
+    return dict(rows.all())
+
+def unique_key(connection, table_name, key):
+    """Whether key is set and unique on every row of table_name."""
+    column = quote_identifier(key)
+    return connection.execute(text(
+        f"SELECT count(*) = count(DISTINCT {column}) FROM {quote_identifier(table_name)}"
+    )).scalar()
+
+def check_for_updates(connection, table_name, staging_name, key=None):
+    """Compare the staged data with the current table by content hash.
+
+    Rows are matched on key, a property column that identifies a feature
+    across loads; without one they are matched on the hash itself, so an
+    edit shows up as a delete plus an insert. Returns the number of
+    inserted, changed and deleted rows, or None when the tables can't be
+    diffed (no current table, no hashes yet, a missing or non-unique key,
+    or a column whose type changed) and the table has to be replaced.
+    """
+    current = table_columns(connection, table_name)
+    staged = table_columns(connection, staging_name)
+    key = key or HASH_COLUMN
+    if HASH_COLUMN not in current:
+        logging.info(f"Table {table_name} has no content hashes, replacing it")
+        return None
+    if key not in current or key not in staged:
+        logging.warning(f"Key column {key} is missing, replacing {table_name}")
+        return None
+    changed_types = [name for name, type_ in staged.items() if current.get(name, type_) != type_]
+    if changed_types:
+        logging.info(f"Column types changed for {', '.join(changed_types)}, replacing {table_name}")
+        return None
+    if not (unique_key(connection, table_name, key) and unique_key(connection, staging_name, key)):
+        logging.warning(f"Key column {key} has duplicate or empty values, replacing {table_name}")
+        return None
+
+    table, staging = quote_identifier(table_name), quote_identifier(staging_name)
+    key = quote_identifier(key)
+    return {
+        "inserted": connection.execute(text(
+            f"SELECT count(*) FROM {staging} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})"
+        )).scalar(),
+        "changed": connection.execute(text(
+            f"SELECT count(*) FROM {table} t JOIN {staging} s ON t.{key} = s.{key} "
+            f"WHERE t.{HASH_COLUMN} IS DISTINCT FROM s.{HASH_COLUMN}"
+        )).scalar(),
+        "deleted": connection.execute(text(
+            f"SELECT count(*) FROM {table} t "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})"
+        )).scalar(),
+    }
+
+def build_indexes(connection, table_name, key=None, name_column=NAME_COLUMN):
+    """Index a staged table the way the live one is indexed, before the swap.
+
+    Adds the primary key on key (when its values are unique), a btree
+    index on name_column and the spatial index, then analyzes the table
+    so the first queries after the swap have statistics to plan with.
+    Index names start with idx_<table>_, which rename_table() relies on.
+    """
+    columns = table_columns(connection, table_name)
+    table = quote_identifier(table_name)
+    if key and key in columns:
+        if unique_key(connection, table_name, key):
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {quote_identifier(f'{table_name}_pkey')} "
+                f"PRIMARY KEY ({quote_identifier(key)})"
+            ))
+        else:
+            logging.warning(f"Key column {key} has duplicate or empty values, {table_name} gets no primary key")
+    if name_column in columns:
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {quote_identifier(f'idx_{table_name}_{name_column}')} "
+            f"ON {table} ({quote_identifier(name_column)})"
+        ))
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {quote_identifier(f'idx_{table_name}_{GEOMETRY_COLUMN}')} "
+        f"ON {table} USING gist ({GEOMETRY_COLUMN})"
+    ))
+    connection.execute(text(f"ANALYZE {table}"))
+
+def rename_table(connection, old_name, new_name):
+    """Rename a table along with its idx_<table>_ indexes and primary key.
+
+    Index names are unique per schema, so they have to follow the table
+    or the next staging table couldn't reuse them.
+    """
+    connection.execute(text(f"ALTER TABLE {quote_identifier(old_name)} RENAME TO {quote_identifier(new_name)}"))
+    indexes = connection.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": new_name}).scalars().all()
+    for index in indexes:
+        for old_prefix, new_prefix in ((f"idx_{old_name}_", f"idx_{new_name}_"), (f"{old_name}_pkey", f"{new_name}_pkey")):
+            if index.startswith(old_prefix):
+                connection.execute(text(
+                    f"ALTER INDEX {quote_identifier(index)} "
+                    f"RENAME TO {quote_identifier(new_prefix + index[len(old_prefix):])}"
+                ))
+                break
+
+def run_with_lock_timeout(engine, work, lock_timeout=LOCK_TIMEOUT, retries=LOCK_RETRIES):
+    """Run work(connection) in one transaction, giving up on slow locks.
+
+    Altering or renaming the live table needs an exclusive lock. Waiting
+    for it behind a long query would stall every reader that arrives in
+    the meantime, so after lock_timeout the transaction is rolled back
+    and retried, up to retries times.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+                                   {"timeout": lock_timeout})
+                return work(connection)
+        except OperationalError as e:
+            if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE or attempt == retries:
+                raise
+            logging.warning(f"Timed out waiting for a table lock (attempt {attempt}), retrying")
+            time.sleep(attempt)
+
+def history_tables(table_name):
+    """Names of the versions table and the row history table of table_name."""
+    return f"{table_name}_versions", f"{table_name}_history"
+
+def retained_name(table_name, version):
+    """Name the table replaced by a full-replace version is kept under."""
+    return f"{table_name}_v{version}"
+
+def ensure_history(connection, table_name):
+    """Create the versions and history tables of table_name if needed.
+
+    Every update is a version. A diff update stores the previous state of
+    each row it touches in the history table: the old row as JSON for
+    changed and deleted rows, just the key for inserted ones. A full
+    replace keeps the old table under retained_name() instead.
+    """
+    versions, history = (quote_identifier(n) for n in history_tables(table_name))
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {versions} ("
+        "version serial PRIMARY KEY, "
+        "created_at timestamp NOT NULL DEFAULT now(), "
+        "kind text NOT NULL, "
+        "key_column text, "
+        "inserted integer, changed integer, deleted integer)"
+    ))
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {history} ("
+        f"version integer NOT NULL REFERENCES {versions} ON DELETE CASCADE, "
+        "feature_key text NOT NULL, "
+        "row jsonb)"
+    ))
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {quote_identifier(f'idx_{table_name}_history_version')} "
+        f"ON {history} (version)"
+    ))
+
+def start_version(connection, table_name, kind, key=None):
+    ensure_history(connection, table_name)
+    versions, _ = history_tables(table_name)
+    return connection.execute(text(
+        f"INSERT INTO {quote_identifier(versions)} (kind, key_column) VALUES (:kind, :key) RETURNING version"
+    ), {"kind": kind, "key": key}).scalar()
+
+def prune_versions(connection, table_name, retention=RETENTION):
+    """Forget all but the newest retention versions, dropping their retained tables."""
+    versions, _ = history_tables(table_name)
+    pruned = connection.execute(text(
+        f"SELECT version, kind FROM {quote_identifier(versions)} ORDER BY version DESC OFFSET :retention"
+    ), {"retention": max(retention, 0)}).all()
+    for version, kind in pruned:
+        if kind == "replace":
+            connection.execute(text(f"DROP TABLE IF EXISTS {quote_identifier(retained_name(table_name, version))}"))
+    if pruned:
+        connection.execute(text(
+            f"DELETE FROM {quote_identifier(versions)} WHERE version <= :version"
+        ), {"version": pruned[0][0]})
+        logging.info(f"Pruned {len(pruned)} old versions of {table_name}")
+
+def replace_table(engine, table_name, staging_name, key=None, name_column=NAME_COLUMN, retention=RETENTION):
+    """Put the staged table in place of the current one.
+
+    The staged table is indexed and analyzed in a transaction of its own,
+    which locks nothing readers use. Only the swap, two renames (with
+    their indexes), then runs under lock_timeout and is retried, so it
+    holds the live table's lock for a catalog update rather than an index
+    build, and readers see either the old table or the new one, never
+    none. The current table is renamed rather than copied, so it can be
+    restored by rollback() until it falls out of retention.
+    """
+    with engine.begin() as connection:
+        build_indexes(connection, staging_name, key, name_column)
+
+    def swap(connection):
+        if table_columns(connection, table_name):
+            version = start_version(connection, table_name, "replace")
+            rename_table(connection, table_name, retained_name(table_name, version))
+            logging.info(f"Kept the previous table as version {version}")
+        rename_table(connection, staging_name, table_name)
+
+    run_with_lock_timeout(engine, swap)
+    with engine.begin() as connection:
+        if table_columns(connection, history_tables(table_name)[0]):
+            prune_versions(connection, table_name, retention)
+
+def apply_changes(connection, table_name, staging_name, key=None, retention=RETENTION):
+    """Apply only the differences between the staged data and the table.
+
+    The previous state of the touched rows goes to the history table as a
+    new version first, so the backup is as large as the change rather
+    than the whole table. New property columns are added; columns the
+    source no longer has are cleared on the rows that are rewritten.
+    Returns the affected row counts. Run inside one transaction with
+    check_for_updates.
+    """
+    current = table_columns(connection, table_name)
+    staged = table_columns(connection, staging_name)
+    table, staging = quote_identifier(table_name), quote_identifier(staging_name)
+    key_column = key or HASH_COLUMN
+    key = quote_identifier(key_column)
+
+    for name, type_ in staged.items():
+        if name not in current:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {quote_identifier(name)} {type_}"))
+
+    version = start_version(connection, table_name, "diff", key_column)
+    versions, history = (quote_identifier(n) for n in history_tables(table_name))
+    # Geometry is kept in its text form (hex EWKB), which its input
+    # function reads back; its JSON form would be GeoJSON
+    connection.execute(text(
+        f"INSERT INTO {history} (version, feature_key, row) "
+        f"SELECT :version, t.{key}::text, to_jsonb(t) || jsonb_build_object('{GEOMETRY_COLUMN}', t.{GEOMETRY_COLUMN}::text) "
+        f"FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM {staging} s "
+        f"WHERE s.{key} = t.{key} AND s.{HASH_COLUMN} = t.{HASH_COLUMN})"
+    ), {"version": version})
+    connection.execute(text(
+        f"INSERT INTO {history} (version, feature_key) SELECT :version, s.{key}::text FROM {staging} s "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})"
+    ), {"version": version})
+
+    deleted = connection.execute(text(
+        f"DELETE FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})"
+    )).rowcount
+    assignments = [f"{quote_identifier(n)} = s.{quote_identifier(n)}" for n in staged]
+    assignments += [f"{quote_identifier(n)} = NULL" for n in current if n not in staged]
+    changed = connection.execute(text(
+        f"UPDATE {table} t SET {', '.join(assignments)} FROM {staging} s "
+        f"WHERE t.{key} = s.{key} AND t.{HASH_COLUMN} IS DISTINCT FROM s.{HASH_COLUMN}"
+    )).rowcount
+    columns = ", ".join(quote_identifier(n) for n in staged)
+    inserted = connection.execute(text(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} s "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})"
+    )).rowcount
+    connection.execute(text(f"DROP TABLE {staging}"))
+    connection.execute(text(
+        f"UPDATE {versions} SET inserted = :inserted, changed = :changed, deleted = :deleted "
+        "WHERE version = :version"
+    ), {"inserted": inserted, "changed": changed, "deleted": deleted, "version": version})
+    logging.info(f"Recorded version {version} of {table_name}")
+    prune_versions(connection, table_name, retention)
+    return {"inserted": inserted, "changed": changed, "deleted": deleted}
+
+def list_versions(connection, table_name):
+    """(version, created_at, kind, inserted, changed, deleted) rows, newest first."""
+    versions, _ = history_tables(table_name)
+    if not table_columns(connection, versions):
+        return []
+    return connection.execute(text(
+        f"SELECT version, created_at, kind, inserted, changed, deleted "
+        f"FROM {quote_identifier(versions)} ORDER BY version DESC"
+    )).all()
+
+def rollback(connection, table_name, version=None):
+    """Undo version (default: the latest) and every version after it.
+
+    Versions are undone newest first: a diff version deletes the rows it
+    inserted or changed and restores the old copies from the history
+    table; a replace version swaps the retained table back in. Returns
+    the versions undone.
+    """
+    versions, history = history_tables(table_name)
+    if not table_columns(connection, versions):
+        raise ValueError(f"{table_name} has no versions to roll back")
+    versions, history = quote_identifier(versions), quote_identifier(history)
+    if version is None:
+        version = connection.execute(text(f"SELECT max(version) FROM {versions}")).scalar()
+    undone = connection.execute(text(
+        f"SELECT version, kind, key_column FROM {versions} WHERE version >= :version ORDER BY version DESC"
+    ), {"version": version}).all()
+    if not undone or undone[-1][0] != version:
+        raise ValueError(f"Version {version} of {table_name} is not retained")
+
+    table = quote_identifier(table_name)
+    for number, kind, key_column in undone:
+        if kind == "replace":
+            connection.execute(text(f"DROP TABLE {table}"))
+            rename_table(connection, retained_name(table_name, number), table_name)
+        else:
+            key = quote_identifier(key_column)
+            connection.execute(text(
+                f"DELETE FROM {table} WHERE {key}::text IN "
+                f"(SELECT feature_key FROM {history} WHERE version = :version)"
+            ), {"version": number})
+            connection.execute(text(
+                f"INSERT INTO {table} SELECT (jsonb_populate_record(NULL::{table}, row)).* "
+                f"FROM {history} WHERE version = :version AND row IS NOT NULL"
+            ), {"version": number})
+        connection.execute(text(f"DELETE FROM {versions} WHERE version = :version"), {"version": number})
+        logging.info(f"Rolled back version {number} ({kind}) of {table_name}")
+    return [number for number, _, _ in undone]
+
+def main():
+    """Main function to run the automated update"""
+    try:
+        # Load environment variables
+        load_dotenv()
+
+        # Configuration
+        parser = argparse.ArgumentParser(description="Refresh a PostGIS table from a GeoJSON source")
+        parser.add_argument(
+            "source", nargs="?",
+            default="https://raw.githubusercontent.com/datasets/geo-countries/master/data/countries.geojson"
+        )
+        parser.add_argument("--table", default="countries")
+        parser.add_argument("--key", default=os.getenv("UPDATE_KEY") or None,
+                            help="property that identifies a feature across updates")
+        parser.add_argument("--mode", choices=("diff", "replace"), default=os.getenv("UPDATE_MODE", "diff"),
+                            help="apply only the changed rows, or swap in a freshly indexed table")
+        parser.add_argument("--name-column", default=NAME_COLUMN, help="property to index for lookups by name")
+        parser.add_argument("--retention", type=int, default=RETENTION,
+                            help="number of updates kept for rollback")
+        parser.add_argument("--rollback", nargs="?", type=int, const=0, metavar="VERSION",
+                            help="undo VERSION and every later update (default: the latest) and exit")
+        parser.add_argument("--versions", action="store_true", help="list the versions that can be rolled back")
+        args = parser.parse_args()
+        table_name = args.table
+        staging_name = f"{table_name}_temp"
+
+        # Create database engine
+        db_params = {
+            'host': os.getenv('DB_HOST'),
+            'port': os.getenv('DB_PORT'),
+            'database': os.getenv('DB_NAME'),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+        engine = create_engine(
+            f"postgresql://{db_params['user']}:{db_params['password']}@"
+            f"{db_params['host']}:{db_params['port']}/{db_params['database']}"
+        )
+
+        if args.versions:
+            with engine.connect() as connection:
+                for version, created_at, kind, inserted, changed, deleted in list_versions(connection, table_name):
+                    counts = f"inserted {inserted}, changed {changed}, deleted {deleted}" if kind == "diff" else ""
+                    print(f"{version:6d}  {created_at:%Y-%m-%d %H:%M:%S}  {kind:8s} {counts}")
+            return
+        if args.rollback is not None:
+            run_with_lock_timeout(engine, lambda connection: rollback(connection, table_name, args.rollback or None))
+            return
+
+        logging.info("Starting automated update process")
+
+        # Process the new data
+        if not process_and_store_data(args.source, staging_name):
+            logging.error("Failed to process and store new data")
+            return
+
+        changes = None
+        if args.mode == "diff":
+            with engine.connect() as connection:
+                changes = check_for_updates(connection, table_name, staging_name, args.key)
+        if changes is None:
+            replace_table(engine, table_name, staging_name, args.key, args.name_column, args.retention)
+            logging.info("Successfully replaced the data")
+        elif not any(changes.values()):
+            logging.info("No changes detected in the data")
+            with engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE {quote_identifier(staging_name)}"))
+        else:
+            logging.info("Changes detected in the data: " + ", ".join(f"{n} {c}" for n, c in changes.items()))
+            # One transaction, so readers see the old rows or the new ones
+            # and a failure leaves the table as it was
+            applied = run_with_lock_timeout(
+                engine, lambda connection: apply_changes(connection, table_name, staging_name, args.key, args.retention)
+            )
+            logging.info("Successfully updated the data: " + ", ".join(f"{n} {c}" for n, c in applied.items()))
+
+    except Exception as e:
+        logging.error(f"Error in automated update: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 import os
+import time
+import logging
+import threading
 from dotenv import load_dotenv
 from typing import List
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,8 +26,153 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "Mymobile11")
 # SQLAlchemy Database URL (using pg8000)
 SQLALCHEMY_DATABASE_URL = f"postgresql+pg8000://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# With DB_ASYNC on, the API runs its queries through an AsyncSession over
+# an async driver (asyncpg by default) instead of blocking a worker thread
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv(
+    "DB_ASYNC_URL",
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Per-statement limit in milliseconds; 0 leaves the server default
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Checkouts that wait longer than this are logged as warnings
+DB_POOL_SLOW_WAIT_MS = float(os.getenv("DB_POOL_SLOW_WAIT_MS", "100"))
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
+
+
+class PoolStats:
+    """Counters for pool checkouts, kept by TimedQueuePool and pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+        if seconds * 1000 >= DB_POOL_SLOW_WAIT_MS:
+            logger.warning(f"Waited {seconds * 1000:.0f} ms for a database connection ({pool_status()})")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.wait_total * 1000, 3),
+                "wait_avg_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection.
+
+    The wait includes opening a new connection when the pool has to grow.
+    """
+
+    stats = pool_stats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.count("timeouts")
+            raise
+        self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for the async engine."""
+
+    stats = async_pool_stats
+
+
+def _watch_pool(sync_engine, stats: PoolStats):
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.count("connects")
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+            cursor.close()
+            # Keep the setting out of the first transaction's rollback
+            dbapi_connection.commit()
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.count("invalidations")
+
+
 # Create SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
+_watch_pool(engine, pool_stats)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=TimedAsyncQueuePool, **POOL_OPTIONS
+    )
+    _watch_pool(async_engine.sync_engine, async_pool_stats)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_status(pool, stats: PoolStats):
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+    }
+    status.update(stats.snapshot())
+    return status
+
+
+def pool_status():
+    """Current pool occupancy and checkout counters as a dict.
+
+    The async engine's pool, when enabled, is reported under "async".
+    """
+    status = _pool_status(engine.pool, pool_stats)
+    if async_engine is not None:
+        status["async"] = _pool_status(async_engine.pool, async_pool_stats)
+    return status
 
 # Create session maker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,310 @@
+import itertools
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: lock a byte of the lock file instead
+    fcntl = None
+    import msvcrt
+
+
+def _encode(value: Any) -> bytes:
+    # Compact separators and no indent, so a record never spans lines
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FeatureStore:
+    """GeoJSON features kept in an append-only log with an in-memory offset index.
+
+    Each line of the log is one record:
+
+        M <json>        collection members other than "features"
+        P <id> <json>   a feature, new or replacing the one with that id
+        D <id>          a deleted feature
+
+    Features are addressed by position in the collection, as the Flask
+    routes always did; positions map to stable ids that the log uses. An
+    edit appends one record, so it costs the size of the feature rather
+    than of the file, and reads slice feature JSON out of a memory map of
+    the log without parsing it.
+
+    Several processes can share a log: writers take an exclusive lock on
+    a sidecar .lock file and first catch up with what others appended,
+    and every operation replays records appended since the last one. When
+    dead records outweigh live ones (and the log is past
+    compact_min_bytes) it is rewritten with only the live features and
+    atomically swapped in; processes notice the new file and reload.
+    """
+
+    def __init__(self, path: str, source: Optional[str] = None, compact_min_bytes: int = 1024 * 1024,
+                 durable: bool = False):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.compact_min_bytes = compact_min_bytes
+        self.durable = durable
+        self._lock = threading.RLock()
+        self._file = None
+        self._map = None
+        self._identity: Optional[Tuple[int, int]] = None
+        self._collection: Optional[Tuple[str, bytes]] = None  # (version, JSON) of the last collection read
+        self._reset()
+        with self._writing():
+            if self._end == 0:
+                self._initialize(source)
+
+    def _reset(self):
+        self._meta: Dict[str, Any] = {"type": "FeatureCollection"}
+        self._order: List[int] = []  # live ids in collection order
+        self._spans: Dict[int, Tuple[int, int]] = {}  # id -> (offset, length) of its JSON
+        self._next_id = 0
+        self._end = 0  # bytes of the log replayed so far
+        self._live_bytes = 0  # feature JSON of the live features
+        self._dead_bytes = 0  # replaced and deleted features, and deletion records
+
+    # Files
+
+    def _open(self):
+        self._file = open(self.path, "a+b")
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._map = None
+        self._reset()
+
+    def _close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:  # a reader still holds a slice; freed with it
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    # Replay
+
+    def _refresh(self):
+        """Catch up with the log on disk: reload if it was replaced, replay what was appended."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if self._file is None or stat is None or (stat.st_dev, stat.st_ino) != self._identity:
+            self._close()
+            self._open()
+            stat = os.fstat(self._file.fileno())
+        if stat.st_size > self._end:
+            if self._map is None or len(self._map) < stat.st_size:
+                old, self._map = self._map, mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                if old is not None:
+                    try:
+                        old.close()
+                    except BufferError:
+                        pass
+            self._replay(self._map, stat.st_size)
+
+    def _replay(self, data, size: int):
+        # Only whole lines: a writer may be midway through the last one
+        position = self._end
+        while position < size:
+            newline = data.find(b"\n", position, size)
+            if newline < 0:
+                break
+            kind = data[position:position + 1]
+            if kind == b"P":
+                space = data.find(b" ", position + 2, newline)
+                feature_id = int(data[position + 2:space])
+                previous = self._spans.get(feature_id)
+                if previous is None:
+                    self._order.append(feature_id)
+                    self._next_id = max(self._next_id, feature_id + 1)
+                else:
+                    self._live_bytes -= previous[1]
+                    self._dead_bytes += previous[1]
+                self._spans[feature_id] = (space + 1, newline - space - 1)
+                self._live_bytes += newline - space - 1
+            elif kind == b"D":
+                feature_id = int(data[position + 2:newline])
+                previous = self._spans.pop(feature_id, None)
+                if previous is not None:
+                    self._order.remove(feature_id)
+                    self._live_bytes -= previous[1]
+                    self._dead_bytes += previous[1]
+                self._dead_bytes += newline + 1 - position
+            elif kind == b"M":
+                self._meta = json.loads(bytes(data[position + 2:newline]))
+            position = newline + 1
+        self._end = position
+
+    # Writing
+
+    @contextmanager
+    def _writing(self):
+        with self._lock, self._file_lock():
+            self._refresh()
+            if os.fstat(self._file.fileno()).st_size > self._end:
+                # A torn record from a writer that died mid-append
+                self._file.truncate(self._end)
+            yield
+            if self._dead_bytes > max(self._live_bytes, self.compact_min_bytes):
+                self._compact()
+
+    def _append(self, record: bytes):
+        # The file is opened for appending, so this lands at the end
+        self._file.write(record)
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self._refresh()
+
+    @staticmethod
+    def _put_record(feature_id: int, feature_bytes: bytes) -> bytes:
+        return b"P %d %s\n" % (feature_id, feature_bytes)
+
+    def _initialize(self, source: Optional[str]):
+        """Start the log, importing the features of a GeoJSON file if there is one."""
+        data = {"type": "FeatureCollection", "features": []}
+        if source is not None:
+            try:
+                with open(source, "rb") as file:
+                    data = json.load(file)
+            except FileNotFoundError:
+                pass
+        meta = {key: value for key, value in data.items() if key != "features"}
+        self._write_log(itertools.chain([b"M " + _encode(meta) + b"\n"], (
+            self._put_record(feature_id, _encode(feature)) for feature_id, feature in enumerate(data["features"])
+        )))
+
+    def _write_log(self, records):
+        """Replace the log with records, atomically."""
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            for record in records:
+                file.write(record)
+            file.flush()
+            os.fsync(file.fileno())
+        self._close()
+        os.replace(temporary, self.path)
+        self._refresh()
+
+    def _compact(self):
+        view = memoryview(self._map)
+        try:
+            self._write_log(itertools.chain([b"M " + _encode(self._meta) + b"\n"], (
+                self._put_record(feature_id, view[offset:offset + length])
+                for feature_id in self._order
+                for offset, length in (self._spans[feature_id],)
+            )))
+        finally:
+            view.release()
+
+    def compact(self):
+        """Rewrite the log with only the live features."""
+        with self._writing():
+            self._compact()
+
+    # Collection API
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._order)
+
+    def _feature_bytes(self, feature_id: int) -> bytes:
+        offset, length = self._spans[feature_id]
+        return self._map[offset:offset + length]
+
+    def get(self, position: int) -> Optional[Any]:
+        """The feature at a position, or None when there is none."""
+        with self._lock:
+            self._refresh()
+            if not 0 <= position < len(self._order):
+                return None
+            return json.loads(self._feature_bytes(self._order[position]))
+
+    def _build_collection(self) -> bytes:
+        head = _encode({**self._meta, "features": []})[:-2]
+        if not self._order:
+            return head + b"]}"
+        # One copy, straight out of the memory map into the joined bytes
+        view = memoryview(self._map)
+        try:
+            features = b",".join(
+                view[offset:offset + length]
+                for offset, length in map(self._spans.__getitem__, self._order)
+            )
+        finally:
+            view.release()
+        return b"".join((head, features, b"]}"))
+
+    def collection(self) -> Tuple[str, bytes]:
+        """The whole FeatureCollection as JSON, and a version string for it.
+
+        The JSON is assembled from the stored feature JSON without parsing
+        it, on the first call after the log changes, and shared by every
+        call until the next change. The version (log file identity and
+        length) changes with every edit, from this process or another, so
+        it also serves as an ETag.
+        """
+        with self._lock:
+            self._refresh()
+            version = "%x-%x-%x" % (self._identity + (self._end,))
+            if self._collection is None or self._collection[0] != version:
+                self._collection = (version, self._build_collection())
+            return self._collection
+
+    def collection_bytes(self) -> bytes:
+        """The whole FeatureCollection as JSON (see collection())."""
+        return self.collection()[1]
+
+    def append(self, feature: Any) -> int:
+        """Add a feature at the end; returns its position."""
+        feature_bytes = _encode(feature)
+        with self._writing():
+            self._append(self._put_record(self._next_id, feature_bytes))
+            return len(self._order) - 1
+
+    def replace(self, position: int, feature: Any) -> bool:
+        """Replace the feature at a position; False when there is none."""
+        feature_bytes = _encode(feature)
+        with self._writing():
+            if not 0 <= position < len(self._order):
+                return False
+            self._append(self._put_record(self._order[position], feature_bytes))
+            return True
+
+    def delete(self, position: int) -> Optional[Any]:
+        """Remove the feature at a position, returning it; None when there is none."""
+        with self._writing():
+            if not 0 <= position < len(self._order):
+                return None
+            feature_id = self._order[position]
+            feature = json.loads(self._feature_bytes(feature_id))
+            self._append(b"D %d\n" % feature_id)
+            return feature
@@ -1,58 +1,54 @@
 from flask import Flask, jsonify, request
-import json
+import os
+import sys
+
+# Add this directory to the Python path for the feature store
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from feature_store import FeatureStore
 
 app = Flask(__name__)
 
-# Load GeoJSON data
+# GeoJSON data, imported once into an append-only feature log that every
+# route reads and edits in place of the whole file
 GEOJSON_FILE = 'karnataka.geoJSON'
-
-def load_geojson():
-    """Load GeoJSON data from file."""
-    try:
-        with open(GEOJSON_FILE, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {"type": "FeatureCollection", "features": []}
-
-def save_geojson(data):
-    """Save GeoJSON data to file."""
-    with open(GEOJSON_FILE, 'w') as file:
-        json.dump(data, file)
+store = FeatureStore(
+    os.getenv("GEOJSON_STORE", GEOJSON_FILE + '.log'),
+    source=GEOJSON_FILE,
+    compact_min_bytes=int(os.getenv("GEOJSON_COMPACT_MIN_BYTES", str(1024 * 1024))),
+    durable=os.getenv("GEOJSON_FSYNC", "false").lower() in ("1", "true", "yes")
+)
 
 # API Endpoints
 @app.route('/geojson', methods=['GET'])
 def get_geojson():
     """Read all GeoJSON features."""
-    data = load_geojson()
-    return jsonify(data)
+    # Served from the store's cached collection JSON until the next edit;
+    # clients holding the current version get a 304
+    version, body = store.collection()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(version)
+    return response.make_conditional(request)
 
 @app.route('/geojson', methods=['POST'])
 def add_feature():
     """Add a new feature to GeoJSON."""
     new_feature = request.json
-    data = load_geojson()
-    data['features'].append(new_feature)
-    save_geojson(data)
+    store.append(new_feature)
     return jsonify({"message": "Feature added successfully!"}), 201
 
 @app.route('/geojson/<int:feature_id>', methods=['PUT'])
 def update_feature(feature_id):
     """Update a feature in GeoJSON."""
     updated_feature = request.json
-    data = load_geojson()
-    if 0 <= feature_id < len(data['features']):
-        data['features'][feature_id] = updated_feature
-        save_geojson(data)
+    if store.replace(feature_id, updated_feature):
         return jsonify({"message": "Feature updated successfully!"})
     return jsonify({"error": "Feature not found!"}), 404
 
 @app.route('/geojson/<int:feature_id>', methods=['DELETE'])
 def delete_feature(feature_id):
     """Delete a feature from GeoJSON."""
-    data = load_geojson()
-    if 0 <= feature_id < len(data['features']):
-        deleted_feature = data['features'].pop(feature_id)
-        save_geojson(data)
+    deleted_feature = store.delete(feature_id)
+    if deleted_feature is not None:
         return jsonify({"message": "Feature deleted successfully!", "feature": deleted_feature})
     return jsonify({"error": "Feature not found!"}), 404
 
@@ -0,0 +1,181 @@
+import csv
+import io
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import JSON, Text, bindparam, cast, column, insert, text, update, values
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# Rows per UPDATE ... FROM (VALUES ...) statement; keeps bind parameters
+# well under the Postgres limit of 65535
+UPDATE_CHUNK_SIZE = 2000
+
+
+# NULL marker of the CSV COPY; CSV's default, an unquoted empty value, is
+# also what csv.writer makes of an empty string
+COPY_NULL = r"\N"
+
+
+def _quoted_row(row: Sequence[Any]) -> str:
+    # Every value quoted, which COPY never reads as NULL
+    return ",".join(
+        COPY_NULL if value is None else '"' + str(value).replace('"', '""') + '"' for value in row
+    ) + "\r\n"
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]):
+    """COPY rows into table through one in-memory CSV buffer (pg8000 cursor).
+
+    None is written as the NULL marker, so empty strings stay empty
+    strings as they do with the other drivers and INSERT.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        if COPY_NULL in row:
+            # The text \N itself: csv.writer would leave it unquoted
+            buffer.write(_quoted_row(row))
+        else:
+            writer.writerow([COPY_NULL if value is None else value for value in row])
+    buffer.seek(0)
+    cur.execute(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        stream=buffer
+    )
+
+
+def insert_rows(cur, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]):
+    """Insert rows with a single multi-row INSERT statement (DBAPI cursor)."""
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    cur.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        + ", ".join([placeholders] * len(rows)),
+        [value for row in rows for value in row]
+    )
+
+
+def _bind_type(table_column):
+    """Type to bind a column's values with.
+
+    JSON columns take JSON text and store the document it holds; bound
+    through the JSON type the text would be stored as a JSON string.
+    """
+    return Text() if isinstance(table_column.type, JSON) else table_column.type
+
+
+def bind_values(table, names: Sequence[str]) -> Dict[str, Any]:
+    """values() of bind parameters named after columns, JSON columns taking JSON text."""
+    return {n: bindparam(n, type_=_bind_type(table.c[n])) for n in names}
+
+
+def _uses_copy(db: Session) -> bool:
+    dialect = db.get_bind().dialect
+    return dialect.name == "postgresql" and dialect.driver in ("pg8000", "asyncpg")
+
+
+def _copy(db: Session, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]):
+    """COPY rows through the session's own connection and transaction.
+
+    The COPY bypasses SQLAlchemy's execute, so driver errors (a duplicate
+    key, say) are wrapped here into the same DBAPIError subclasses ORM
+    statements raise.
+    """
+    dialect = db.get_bind().dialect
+    try:
+        _copy_with_driver(db, dialect, table, columns, rows)
+    except SQLAlchemyError:
+        raise
+    except Exception as e:
+        raise DBAPIError.instance(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN", None, e, dialect.loaded_dbapi.Error,
+            hide_parameters=True, dialect=dialect
+        ) from e
+
+
+def _copy_with_driver(db: Session, dialect, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]):
+    connection = db.connection()
+    if dialect.driver == "asyncpg":
+        # Session.run_sync() under AsyncSession: drive asyncpg's binary COPY
+        # from this greenlet. The adapter begins its transaction with the
+        # first statement SQLAlchemy sends, so send one if none has been,
+        # and the COPY lands inside the session's transaction.
+        from sqlalchemy.util import await_only
+
+        driver_connection = connection.connection.driver_connection
+        if not driver_connection.is_in_transaction():
+            connection.exec_driver_sql("SELECT 1")
+        await_only(driver_connection.copy_records_to_table(
+            table, records=[tuple(row) for row in rows], columns=list(columns)
+        ))
+        return
+    dbapi_connection = connection.connection.dbapi_connection
+    cur = dbapi_connection.cursor()
+    try:
+        copy_rows(cur, table, columns, rows)
+    finally:
+        cur.close()
+
+
+def reserve_ids(db: Session, table: str, count: int) -> List[int]:
+    """Take count ids from a Postgres serial id sequence in one round trip."""
+    return db.execute(
+        text(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, :count)"),
+        {"count": count}
+    ).scalars().all()
+
+
+def bulk_insert(db: Session, model, rows: List[Dict[str, Any]]):
+    """Insert dict rows inside the session's transaction.
+
+    On Postgres (pg8000 or asyncpg) the rows go through COPY on the
+    session's own connection; elsewhere through a plain executemany. JSON
+    columns take JSON text, stored as the document it holds either way.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    if _uses_copy(db):
+        _copy(db, model.__tablename__, columns, [[row[c] for c in columns] for row in rows])
+    else:
+        table = model.__table__
+        db.execute(insert(table).values(bind_values(table, columns)), rows)
+
+
+def bulk_update(db: Session, model, rows: List[Dict[str, Any]]):
+    """Update dict rows by their "id" key; JSON columns take JSON text.
+
+    On Postgres (pg8000 or asyncpg) the rows are COPYed into a temporary table and applied
+    with a single UPDATE ... FROM; other Postgres drivers get one
+    UPDATE ... FROM (VALUES ...) per chunk, and other databases an
+    executemany of single-row UPDATEs.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    names = list(rows[0])
+    if _uses_copy(db):
+        staging = f"bulk_update_{table.name}"
+        db.execute(text(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {', '.join(names)} FROM {table.name} WITH NO DATA"
+        ))
+        _copy(db, staging, names, [[row[n] for n in names] for row in rows])
+        assignments = ", ".join(f"{n} = s.{n}" for n in names if n != "id")
+        db.execute(text(f"UPDATE {table.name} SET {assignments} FROM {staging} s WHERE {table.name}.id = s.id"))
+        db.execute(text(f"DROP TABLE {staging}"))
+        return
+    if db.get_bind().dialect.name != "postgresql":
+        stmt = update(table).where(table.c.id == bindparam("_id")).values(
+            bind_values(table, [n for n in names if n != "id"])
+        )
+        db.execute(stmt, [{**row, "_id": row["id"]} for row in rows])
+        return
+    for start in range(0, len(rows), UPDATE_CHUNK_SIZE):
+        chunk = rows[start:start + UPDATE_CHUNK_SIZE]
+        data = values(*(column(n, _bind_type(table.c[n])) for n in names), name="batch_values").data(
+            [tuple(row[n] for n in names) for row in chunk]
+        )
+        # Cast explicitly: a VALUES column that is NULL in every row is text
+        db.execute(update(table).where(table.c.id == data.c.id).values(
+            {n: cast(data.c[n], table.c[n].type) for n in names if n != "id"}
+        ))
@@ -0,0 +1,232 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+Envelope = Tuple[float, float, float, float]
+
+# Bumped by out-of-process loaders (see load_data.py) so API processes drop
+# their cached responses after a bulk load
+DATA_VERSION_BUMP_SQL = (
+    "INSERT INTO data_version (id, version) VALUES (1, 1) "
+    "ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1"
+)
+
+
+def version_etag(versions: Iterable[Tuple[int, Optional[datetime]]], *extra: Any) -> str:
+    """Strong ETag for a response built from these (id, updated_at) rows.
+
+    Only ids and timestamps are hashed, so the tag can be checked before
+    any geometry is read. extra covers anything else the body depends on.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for feature_id, updated_at in versions:
+        digest.update(f"{feature_id}:{updated_at.isoformat() if updated_at else ''};".encode())
+    digest.update(repr(extra).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC timestamp for Last-Modified."""
+    return format_datetime(value.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: Optional[str]) -> bool:
+    """Whether an If-Modified-Since header is at or after a Last-Modified value."""
+    if not if_modified_since or not last_modified:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(last_modified) <= since
+
+
+class CachedResponse:
+    """Encoded response body and headers.
+
+    encoded holds compressed copies of body by content coding, filled in
+    the first time a client asks for each one.
+    """
+    __slots__ = ("body", "headers", "encoded")
+
+    def __init__(self, body: bytes, headers: Dict[str, str]):
+        self.body = body
+        self.headers = headers
+        self.encoded: Dict[str, bytes] = {}
+
+
+class ListScope(NamedTuple):
+    """Which writes can change a cached list page.
+
+    Keyset pages hold ids in (lo, hi]; offset pages also shift when a row
+    before them comes or goes, so any id <= hi affects them. hi is
+    infinite on the last page, where new features are appended.
+    """
+    keyset: bool
+    lo: float
+    hi: float
+    bbox: Optional[Envelope]
+
+    def affected_by(self, feature_id: int, envelopes: Sequence[Optional[Envelope]]) -> bool:
+        if self.bbox is not None and not any(e is not None and _intersects(self.bbox, e) for e in envelopes):
+            return False
+        if self.keyset:
+            return self.lo < feature_id <= self.hi
+        return feature_id <= self.hi
+
+
+def _intersects(a: Envelope, b: Envelope) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def list_scope(after_id: Optional[int], last_id: Optional[int], has_more: bool,
+               bbox: Optional[Envelope]) -> ListScope:
+    """Scope of a list page that ends at last_id (None if the page is empty)."""
+    hi = last_id if has_more and last_id is not None else math.inf
+    if after_id is not None:
+        return ListScope(True, after_id, hi, bbox)
+    return ListScope(False, 0, hi, bbox)
+
+
+class ResponseCache:
+    """LRU cache of encoded API responses with a TTL.
+
+    Entries are tagged with what they depend on: a single feature id, or a
+    ListScope for list pages. invalidate() drops only the entries a write
+    to one feature can change. check_version() clears everything when an
+    out-of-process loader has bumped the data_version row, and calls the
+    callbacks registered with on_version_change() so other data derived
+    from the table (tiles, indexes) is dropped with it.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, version_check_interval: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._entries: "OrderedDict[Hashable, Tuple[float, CachedResponse, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._version_checked = 0.0
+        self._version_listeners: List[Callable[[], Any]] = []
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every invalidation; pass it back to put()."""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, response, _ = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key: Hashable, response: CachedResponse, scope: Any, generation: int):
+        """Store response; scope is a feature id or a ListScope.
+
+        generation is the value read before the response was built. If a
+        write has invalidated anything since, the response may be stale and
+        isn't stored.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, response, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, feature_id: int, *envelopes: Optional[Envelope]):
+        """Drop entries a write to feature_id (at these envelopes) can change."""
+        with self._lock:
+            stale = [
+                key for key, (_, _, scope) in self._entries.items()
+                if scope == feature_id or (isinstance(scope, ListScope) and scope.affected_by(feature_id, envelopes))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._generation += 1
+
+    def on_version_change(self, callback: Callable[[], Any]):
+        """Call callback (with no arguments) whenever check_version() sees a new data_version."""
+        self._version_listeners.append(callback)
+
+    def check_version(self, db):
+        """Clear the cache if the data_version row moved since the last look.
+
+        Reads the row at most once per version_check_interval seconds, even
+        with the cache disabled, and returns True when it moved.
+        """
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return False
+        self._version_checked = now
+        version = db.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar() or 0
+        changed = self._version is not None and version != self._version
+        if changed:
+            self.clear()
+            for callback in self._version_listeners:
+                callback()
+        self._version = version
+        return changed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
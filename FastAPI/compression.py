@@ -0,0 +1,190 @@
+import zlib
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
+
+# Media types worth compressing; GeoJSON coordinate arrays shrink 5-10x
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/geo+json", "application/javascript",
+    "application/vnd.mapbox-vector-tile", "image/svg+xml", "text/",
+)
+
+
+class ResponseCompression:
+    """gzip/brotli settings and content negotiation.
+
+    Bodies smaller than minimum_size are sent as-is: below a packet or two
+    the CPU costs more than the bytes saved. brotli_quality is kept low by
+    default because dynamic responses are compressed on the request path.
+    """
+
+    def __init__(self, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        """Supported encodings, most preferred first."""
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def negotiate(self, accept_encoding: Optional[str], size: Optional[int] = None) -> Optional[str]:
+        """Pick the encoding for a response, or None to send it uncompressed.
+
+        Follows the q-values of Accept-Encoding; ties go to brotli. size,
+        when known, is checked against minimum_size.
+        """
+        if not accept_encoding or (size is not None and size < self.minimum_size):
+            return None
+        weights: Dict[str, float] = {}
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            q = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            weights[name.strip().lower()] = q
+        best, best_q = None, 0.0
+        for encoding in self.encodings:
+            q = weights.get(encoding, weights.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        compressor = self.compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compressor(self, encoding: str) -> "_StreamCompressor":
+        return _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+
+    @staticmethod
+    def encoded_headers(headers: Dict[str, str], encoding: str) -> Dict[str, str]:
+        """Headers of a representation compressed with encoding.
+
+        A strong ETag belongs to the exact bytes, so it is weakened the way
+        nginx does; If-None-Match uses weak comparison and still matches.
+        """
+        headers = {**headers, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        etag = headers.get("ETag")
+        if etag and etag.startswith('"'):
+            headers["ETag"] = f"W/{etag}"
+        return headers
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses the endpoint didn't encode itself.
+
+    Single-message bodies are compressed in one go and get a Content-Length;
+    streaming bodies (the GeoJSON export) are compressed chunk by chunk.
+    Responses that already carry Content-Encoding, such as precompressed
+    cache hits, pass through untouched.
+    """
+
+    def __init__(self, app, compression: ResponseCompression):
+        self.app = app
+        self.compression = compression
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compression.negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, self.compression, encoding).send)
+
+
+def add_vary(headers: MutableHeaders, field: str):
+    """Add field to the Vary header unless it is already listed (or Vary is *)."""
+    listed = [value.strip().lower() for value in headers.get("vary", "").split(",")]
+    if field.lower() not in listed and "*" not in listed:
+        headers.add_vary_header(field)
+
+
+class _CompressingSend:
+    def __init__(self, send, compression: ResponseCompression, encoding: str):
+        self._send = send
+        self.compression = compression
+        self.encoding = encoding
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _compressible(self) -> bool:
+        headers = Headers(raw=self.start["headers"])
+        if self.start["status"] in (204, 304) or "content-encoding" in headers:
+            return False
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    def _encoded_start(self, length: Optional[int]):
+        headers = MutableHeaders(scope=self.start)
+        headers["content-encoding"] = self.encoding
+        add_vary(headers, "Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and etag.startswith('"'):
+            headers["etag"] = f"W/{etag}"
+        if length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(length)
+        return self.start
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            compressible = self._compressible()
+            if not compressible or (not more_body and len(body) < self.compression.minimum_size):
+                self.passthrough = True
+                if compressible:
+                    add_vary(MutableHeaders(scope=self.start), "Accept-Encoding")
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self.compressor = self.compression.compressor(self.encoding)
+            if not more_body:
+                data = self.compressor.compress(body) + self.compressor.flush()
+                await self._send(self._encoded_start(len(data)))
+                await self._send({"type": "http.response.body", "body": data})
+                return
+            await self._send(self._encoded_start(None))
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,18 +1,83 @@
+import argparse
 import json
 import os
+import sys
+import time
+from datetime import datetime
 import pg8000
 from dotenv import load_dotenv
 
+# Add the project root to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from FastAPI.spatial import envelope_columns
+from FastAPI.simplification import simplify_batch
+from FastAPI.serialization import iter_feature_collection
+from FastAPI.bulk import copy_rows, insert_rows
+from FastAPI.cache import DATA_VERSION_BUMP_SQL
+
 # Load environment variables
 load_dotenv()
 
-def load_karnataka_data():
+FEATURE_COLUMNS = ("id", "name", "description", "geometry",
+                   "min_x", "min_y", "max_x", "max_y", "created_at", "updated_at")
+SIMPLIFIED_COLUMNS = ("feature_id", "level", "geometry")
+
+
+def feature_rows(features, start=1):
+    """Turn GeoJSON features into (name, description, geometry) rows."""
+    for idx, feature in enumerate(features, start):
+        geometry = feature['geometry']
+        name = f"Karnataka Region {idx}"
+        description = f"Region {idx} in Karnataka with geometry type {geometry['type']}"
+        yield name, description, geometry
+
+
+def write_batch(cur, batch, method="copy"):
+    """Write one batch of (name, description, geometry) rows and their levels.
+
+    Ids are reserved from the features sequence up front, so the feature
+    rows and their simplified geometries can both go in as bulk writes.
+    """
+    cur.execute(
+        "SELECT nextval(pg_get_serial_sequence('features', 'id')) "
+        "FROM generate_series(1, %s)",
+        (len(batch),)
+    )
+    ids = [row[0] for row in cur.fetchall()]
+    now = datetime.utcnow()
+
+    geometry_texts = [json.dumps(geometry) for _, _, geometry in batch]
+    features, simplified = [], []
+    for feature_id, (name, description, geometry), geometry_text, levels in zip(
+            ids, batch, geometry_texts, simplify_batch(geometry_texts)):
+        envelope = envelope_columns(geometry)
+        features.append((
+            feature_id, name, description, geometry_text,
+            envelope['min_x'], envelope['min_y'], envelope['max_x'], envelope['max_y'],
+            now, now
+        ))
+        simplified.extend((feature_id, level, text) for level, text in levels.items())
+
+    write = copy_rows if method == "copy" else insert_rows
+    write(cur, "features", FEATURE_COLUMNS, features)
+    if simplified:
+        write(cur, "feature_simplified", SIMPLIFIED_COLUMNS, simplified)
+
+
+def load_karnataka_data(path="karnataka.geojson", batch_size=1000, method="copy"):
+    """Replace the features table with the contents of a GeoJSON file.
+
+    Features are parsed incrementally and written in batches of batch_size
+    with COPY (or multi-row INSERTs with method="insert"), all in one
+    transaction.
+    """
     try:
-        # Read the GeoJSON file
-        print("Reading Karnataka GeoJSON file...")
-        with open("karnataka.geojson", "r") as f:
-            geojson_data = json.loads(f.read())
-        
+        print(f"Loading {path} in batches of {batch_size} using {method}...")
+
         # Connect to PostgreSQL
         conn = pg8000.connect(
             database=os.getenv("DB_NAME"),
@@ -22,41 +87,40 @@ def load_karnataka_data():
             port=int(os.getenv("DB_PORT"))
         )
         cur = conn.cursor()
-        
+
         # First, clear existing data
         cur.execute("DELETE FROM features")
-        
-        # Insert features into database
-        for idx, feature in enumerate(geojson_data['features'], 1):
-            # Extract properties and geometry
-            properties = feature.get('properties', {})
-            geometry = feature['geometry']
-            
-            # Create a meaningful name
-            name = f"Karnataka Region {idx}"
-            description = f"Region {idx} in Karnataka with geometry type {geometry['type']}"
-            
-            # Print what we're inserting
-            print(f"\nInserting feature {idx}:")
-            print(f"Name: {name}")
-            print(f"Geometry Type: {geometry['type']}")
-            print(f"First coordinate: {geometry['coordinates'][0][0] if geometry['coordinates'] else 'No coordinates'}")
-            
-            # Insert into database
-            cur.execute("""
-                INSERT INTO features (name, description, geometry)
-                VALUES (%s, %s, %s)
-            """, (name, description, json.dumps(geometry)))
-        
+
+        started = time.perf_counter()
+        loaded = 0
+        with open(path, "r") as f:
+            batch = []
+            for row in feature_rows(iter_feature_collection(f)):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    write_batch(cur, batch, method)
+                    loaded += len(batch)
+                    batch = []
+                    rate = loaded / (time.perf_counter() - started)
+                    print(f"Loaded {loaded} features ({rate:.0f} rows/s)")
+            if batch:
+                write_batch(cur, batch, method)
+                loaded += len(batch)
+
+        # Tell running API processes to drop their cached responses
+        cur.execute(DATA_VERSION_BUMP_SQL)
+
         # Commit the transaction
         conn.commit()
+        elapsed = time.perf_counter() - started
         print("\nSuccessfully loaded Karnataka data!")
-        
+        print(f"{loaded} features in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):.0f} rows/s)")
+
         # Verify the data
         cur.execute("SELECT COUNT(*) FROM features")
         count = cur.fetchone()[0]
         print(f"Total features loaded: {count}")
-        
+
     except Exception as e:
         print(f"Error loading data: {str(e)}")
         import traceback
@@ -68,4 +132,9 @@ def load_karnataka_data():
             conn.close()
 
 if __name__ == "__main__":
-    load_karnataka_data()
+    parser = argparse.ArgumentParser(description="Bulk load a GeoJSON file into the features table")
+    parser.add_argument("path", nargs="?", default="karnataka.geojson")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--method", choices=("copy", "insert"), default="copy")
+    args = parser.parse_args()
+    load_karnataka_data(args.path, args.batch_size, args.method)
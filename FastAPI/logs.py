@@ -0,0 +1,147 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Dict, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Per-logger levels from "name=LEVEL,name=LEVEL" (e.g. "sqlalchemy.engine=INFO")."""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class _Truncated:
+    """Lazy, size-capped str() of a value for log messages.
+
+    Nothing is rendered unless the record is actually emitted, and then
+    at most limit characters are kept, so a payload with a large geometry
+    can't turn one log line into megabytes.
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text) - self.limit} more chars)"
+
+
+# Set by configure_logging()
+PAYLOAD_MAX_CHARS = 500
+
+
+def truncated(value: Any, limit: Optional[int] = None) -> _Truncated:
+    """Wrap value for logging with %s, keeping at most limit (or PAYLOAD_MAX_CHARS) characters."""
+    return _Truncated(value, PAYLOAD_MAX_CHARS if limit is None else limit)
+
+
+def error_summary(error: BaseException, limit: Optional[int] = None) -> str:
+    """Class name and message of an exception, capped like truncated().
+
+    For SQLAlchemy errors this is the driver's message (error.orig): str()
+    of the wrapper carries the SQL statement and its parameters, which for
+    feature writes are whole geometries.
+    """
+    message = str(getattr(error, "orig", None) or error)
+    return f"{type(error).__name__}: {truncated(message, limit)}"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full.
+
+    A stalled disk then costs lost log lines rather than request latency;
+    dropped counts them.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_configured = False
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def configure_logging(level: str = "INFO", filename: Optional[str] = "app.log", max_bytes: int = 10 * 1024 * 1024,
+                      backups: int = 5, use_queue: bool = True, queue_size: int = 10000,
+                      levels: Optional[Dict[str, str]] = None, payload_max_chars: int = 500):
+    """Configure the root logger for the API.
+
+    Records go to stderr and to a size-rotated file. With use_queue the
+    handlers run on a QueueListener thread: the request path only
+    formats the record and puts it on a bounded queue, and disk writes
+    happen off the event loop. Calling it again does nothing.
+    """
+    global _configured, _listener, _queue_handler, PAYLOAD_MAX_CHARS
+    if _configured:
+        return
+    _configured = True
+    PAYLOAD_MAX_CHARS = payload_max_chars
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if filename:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level.upper())
+    if use_queue:
+        _queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        root.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread; safe to call twice.
+
+    Records logged afterwards (the rest of shutdown) go to the handlers
+    directly.
+    """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        root = logging.getLogger()
+        root.removeHandler(_queue_handler)
+        for handler in listener.handlers:
+            root.addHandler(handler)
+
+
+def logging_stats() -> Dict[str, int]:
+    """Queued and dropped record counts (zero without the queue)."""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
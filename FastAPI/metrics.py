@@ -0,0 +1,277 @@
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B to 64 MiB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+# Where a request's time goes: cursor execute (including the driver
+# reading rows), JSON decoding of stored geometry, response encoding
+PHASES = ("db", "decode", "encode")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-1]!r}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+def gauge_lines(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> Iterable[str]:
+    """Exposition lines of a gauge from (labels, value) pairs."""
+    yield f"# HELP {name} {documentation}"
+    yield f"# TYPE {name} gauge"
+    for labels, value in samples:
+        yield f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}"
+
+
+class RequestTimings:
+    """Time one request spent per phase, and the queries it ran.
+
+    Phases nest: time spent in a phase started inside another one (a
+    query run while a response is encoded) counts only towards the inner
+    phase.
+    """
+    __slots__ = ("phases", "queries", "_stack")
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self._stack: List[List] = []
+
+    def begin(self, phase: str):
+        self._stack.append([phase, time.perf_counter(), 0.0])
+
+    def end(self, expected: Optional[str] = None) -> float:
+        """End the innermost phase (only if it is expected, when given)."""
+        if not self._stack or (expected is not None and self._stack[-1][0] != expected):
+            return 0.0
+        phase, started, nested = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.phases[phase] += elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        return elapsed
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Count the time spent in the block towards a phase of the current request.
+
+    Outside a request (loaders, benchmarks) this does nothing.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.begin(name)
+    try:
+        yield
+    finally:
+        timings.end()
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """Iterate, counting the time spent producing each item towards a phase.
+
+    For streamed responses, where a phase() block around the loop would
+    also count the time spent sending.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class Metrics:
+    """The API's request, query and serialization metrics.
+
+    Collectors are callables returning extra exposition lines, for
+    gauges read from state kept elsewhere (pool and cache counters).
+    """
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time to the last byte of the response.",
+            ("method", "route", "status"))
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size as sent, after compression.",
+            ("method", "route"), SIZE_BUCKETS)
+        self.request_phase = Histogram(
+            "http_request_phase_seconds", "Time a request spent in each phase: db, decode, encode.",
+            ("route", "phase"))
+        self.request_queries = Histogram(
+            "http_request_queries", "SQL statements executed per request.",
+            ("route",), COUNT_BUCKETS)
+        self.query_duration = Histogram(
+            "db_query_duration_seconds", "Cursor execute time per SQL statement, by statement type.",
+            ("statement",))
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for histogram in (self.request_duration, self.response_size, self.request_phase,
+                          self.request_queries, self.query_duration):
+            lines.extend(histogram.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return ("\n".join(lines) + "\n").encode()
+
+    def instrument_engine(self, sync_engine):
+        """Time every statement on an engine (the sync engine of an async one).
+
+        Also times JSON column decoding done while rows are read, by
+        wrapping the dialect's deserializer (the function create_engine()
+        takes as json_deserializer). Drivers that decode JSON themselves,
+        like pg8000, do it inside the execute and it counts as db time.
+        Call before the engine runs its first query: result processors
+        keep the deserializer they were built with.
+        """
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+            timings = _current.get()
+            if timings is not None:
+                timings.begin("db")
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            timings = _current.get()
+            if timings is not None:
+                timings.end()
+                timings.queries += 1
+            keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            self.query_duration.observe(elapsed, keyword)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(context):
+            # A failed execute gets no after_cursor_execute
+            started = context.connection.info.get("query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+                timings = _current.get()
+                if timings is not None:
+                    timings.end("db")
+
+        deserialize = sync_engine.dialect._json_deserializer or json.loads
+
+        def timed_deserializer(value):
+            with phase("decode"):
+                return deserialize(value)
+
+        sync_engine.dialect._json_deserializer = timed_deserializer
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, size and phase metrics.
+
+    Routes are labelled with their path template ("/api/features/{feature_id}"),
+    and requests that match no route with "unmatched", so the number of
+    series stays bounded. Add it last so it wraps the compression
+    middleware and sees bytes as sent.
+    """
+
+    def __init__(self, app, metrics: Metrics, routes: Callable[[], Dict[object, str]]):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        self._route_paths: Optional[Dict[object, str]] = None
+
+    def _route(self, scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = self.routes()
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = self._route(scope)
+            method = scope["method"]
+            self.metrics.request_duration.observe(elapsed, method, route, str(status))
+            self.metrics.response_size.observe(size, method, route)
+            for name, seconds in timings.phases.items():
+                self.metrics.request_phase.observe(seconds, route, name)
+            self.metrics.request_queries.observe(timings.queries, route)
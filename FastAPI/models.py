@@ -6,7 +6,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, Float, Text, ForeignKey
 from datetime import datetime
 from automatation.database import Base
 
@@ -17,5 +17,26 @@ class Feature(Base):
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     geometry = Column(JSON, nullable=False)  # Store GeoJSON directly
+    # Precomputed bounding box of geometry, used by bbox queries
+    min_x = Column(Float, nullable=True)
+    min_y = Column(Float, nullable=True)
+    max_x = Column(Float, nullable=True)
+    max_y = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FeatureSimplified(Base):
+    __tablename__ = 'feature_simplified'
+
+    # Douglas-Peucker simplified geometry per zoom level, written with the feature
+    feature_id = Column(Integer, ForeignKey('features.id', ondelete='CASCADE'), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    geometry = Column(Text, nullable=False)  # GeoJSON text, served as-is
+
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+
+    # Single row (id = 1) bumped by bulk loaders running outside the API,
+    # so API processes know to drop their response caches
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
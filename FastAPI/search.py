@@ -0,0 +1,361 @@
+import bisect
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger(__name__)
+
+# Minimum trigram similarity for a fuzzy match; pg_trgm's own default
+SIMILARITY_THRESHOLD = 0.3
+
+# Trigram indexes behind ILIKE '%q%' and the % similarity operator
+POSTGRES_SEARCH_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_features_name_trgm ON features USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_features_description_trgm ON features USING gin (description gin_trgm_ops)",
+)
+
+# Ranking shared by both backends: name prefix matches (in name order),
+# then name substring matches, then description substring matches (both
+# in id order), then fuzzy matches by similarity. Ties go to the lower id.
+POSTGRES_SEARCH_QUERY = """
+SELECT id FROM features
+WHERE name ILIKE :contains OR description ILIKE :contains OR name % :q OR description % :q
+ORDER BY
+    CASE WHEN name ILIKE :prefix THEN 0
+         WHEN name ILIKE :contains THEN 1
+         WHEN description ILIKE :contains THEN 2
+         ELSE 3 END,
+    CASE WHEN name ILIKE :prefix THEN lower(name) END,
+    CASE WHEN NOT (name ILIKE :contains OR description ILIKE :contains)
+         THEN greatest(similarity(name, :q), similarity(coalesce(description, ''), :q)) END DESC,
+    id
+LIMIT :limit OFFSET :offset
+"""
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize_query(q: str) -> str:
+    """Lowercase q and collapse its whitespace."""
+    return " ".join(q.lower().split())
+
+
+def trigrams(value: str) -> Set[str]:
+    """Trigrams of a string the way pg_trgm extracts them.
+
+    Each alphanumeric word is lowercased and padded with two spaces in
+    front and one behind, so word starts weigh more than word ends.
+    """
+    grams = set()
+    for word in _WORD.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def substring_trigrams(q: str) -> Set[str]:
+    """Trigrams every text containing q must have: the unpadded ones inside its words."""
+    return {word[i:i + 3] for word in _WORD.findall(q) for i in range(len(word) - 2)}
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def ensure_search_schema(engine) -> bool:
+    """Set up trigram search on Postgres; returns whether it is available.
+
+    Needs the pg_trgm extension. When it can't be created (no privilege,
+    or the contrib package isn't installed) search falls back to the
+    in-process TrigramIndex.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for statement in POSTGRES_SEARCH_INDEXES:
+                connection.execute(text(statement))
+        return True
+    except Exception as e:
+        logger.warning("pg_trgm unavailable, searching with the in-process index: %s", e)
+        return False
+
+
+def postgres_search(db, q: str, limit: int, offset: int = 0,
+                    threshold: float = SIMILARITY_THRESHOLD) -> List[int]:
+    """Ids of the features matching q, best first, using the pg_trgm indexes."""
+    q = normalize_query(q)
+    db.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+               {"threshold": str(threshold)})
+    escaped = _like_escape(q)
+    return db.execute(text(POSTGRES_SEARCH_QUERY), {
+        "q": q, "prefix": f"{escaped}%", "contains": f"%{escaped}%", "limit": limit, "offset": offset
+    }).scalars().all()
+
+
+class _FieldIndex:
+    """Trigram posting lists of one text column.
+
+    postings maps a trigram to the sorted row positions holding it; sizes
+    is the number of distinct trigrams of each row, for similarity.
+    """
+
+    def __init__(self, values: Sequence[str]):
+        self.values = values
+        postings: Dict[str, List[int]] = {}
+        sizes = np.zeros(len(values), dtype=np.int32)
+        # Names and descriptions repeat their words a lot, so trigrams
+        # are worked out once per distinct word
+        word_grams: Dict[str, Tuple[str, ...]] = {}
+        for position, value in enumerate(values):
+            grams = set()
+            for word in _WORD.findall(value):
+                cached = word_grams.get(word)
+                if cached is None:
+                    padded = f"  {word} "
+                    cached = word_grams[word] = tuple({padded[i:i + 3] for i in range(len(padded) - 2)})
+                grams.update(cached)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.sizes = sizes
+
+    def containing(self, q: str, batch: int = 4096) -> Iterator[int]:
+        """Positions of the rows whose text contains q, in ascending order.
+
+        Candidates come from the rarest of q's trigrams a batch at a time
+        and are checked against the other posting lists with a binary
+        search, so a common term yields its first matches without
+        intersecting whole lists.
+        """
+        grams = substring_trigrams(q)
+        if not grams:
+            # Too short for a trigram: check every row
+            yield from (i for i, value in enumerate(self.values) if q in value)
+            return
+        lists = sorted((self.postings.get(gram) for gram in grams), key=lambda p: 0 if p is None else len(p))
+        if lists[0] is None:
+            return
+        rarest, others = lists[0], lists[1:]
+        for start in range(0, len(rarest), batch):
+            candidates = rarest[start:start + batch]
+            for posting in others:
+                found = np.searchsorted(posting, candidates)
+                found[found == len(posting)] = 0
+                candidates = candidates[posting[found] == candidates]
+                if not len(candidates):
+                    break
+            for position in candidates.tolist():
+                if q in self.values[position]:
+                    yield position
+
+    def similar(self, grams: Set[str], threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions and similarities of the rows at least threshold similar to q.
+
+        Shared trigrams are counted with a sort of the concatenated
+        posting lists when they are short, and with a bincount over all
+        rows when common trigrams make them long.
+        """
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        needed = max(math.ceil(threshold * len(grams)), 1)
+        if needed > len(lists):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.concatenate(lists)
+        if len(rows) * 16 < len(self.sizes):
+            candidates, shared = np.unique(rows, return_counts=True)
+        else:
+            counts = np.bincount(rows, minlength=len(self.sizes))
+            candidates = np.flatnonzero(counts >= needed)
+            shared = counts[candidates]
+        similarity = shared / (len(grams) + self.sizes[candidates] - shared)
+        keep = similarity >= threshold
+        return candidates[keep], similarity[keep]
+
+
+class TrigramIndex:
+    """In-process search index over feature names and descriptions.
+
+    Used where pg_trgm isn't available. Results are produced tier by tier
+    (see POSTGRES_SEARCH_QUERY for the ranking) and only as far as the
+    requested page, so a query that fills its page with prefix matches
+    never touches the substring or fuzzy tiers.
+
+    A full build reads the whole features table and takes tens of seconds
+    at a million rows, so it happens in a background thread, one at a time,
+    and queries keep using the last snapshot meanwhile. Writes mark their
+    ids dirty: dirty rows are masked out of the snapshot and searched in a
+    small overlay read from the table, and the snapshot is rebuilt once
+    more than rebuild_after of them pile up. Only the very first query
+    waits for a build.
+    """
+
+    def __init__(self, session_factory, threshold: float = SIMILARITY_THRESHOLD, rebuild_after: int = 5000):
+        self.session_factory = session_factory
+        self.threshold = threshold
+        self.rebuild_after = rebuild_after
+        self._lock = threading.Lock()
+        self._built = threading.Condition(self._lock)
+        self._index = None
+        self._error: Optional[BaseException] = None
+        self._building = False
+        self._build_again = False
+        # Ids written since the snapshot's read began; replaced, never
+        # mutated, so a query can hold on to the set it started with
+        self._dirty: FrozenSet[int] = frozenset()
+        self._overlay: Optional[Tuple[FrozenSet[int], dict]] = None
+
+    def start(self):
+        """Begin building the snapshot in the background, if none is under way."""
+        with self._lock:
+            self._start_build()
+
+    def invalidate(self, ids: Optional[Iterable[int]] = None):
+        """Note writes to ids; with no ids, anything may have changed.
+
+        Ids are searched from the table until the next snapshot covers
+        them. Without ids (a data_version bump from a bulk load) the
+        snapshot is rebuilt and serves stale results until it's done.
+        """
+        with self._lock:
+            if ids is None:
+                self._start_build()
+                return
+            self._dirty = self._dirty.union(ids)
+            if len(self._dirty) > self.rebuild_after:
+                self._start_build()
+
+    def _start_build(self):
+        # Called with the lock held
+        if self._building:
+            # Writes noted before the running build's read are in it; a
+            # bulk load may not be
+            self._build_again = True
+            return
+        self._building = True
+        threading.Thread(target=self._build_snapshots, name="trigram-index", daemon=True).start()
+
+    def _build_snapshots(self):
+        while True:
+            with self._lock:
+                self._build_again = False
+                # Committed before the read starts, so the read sees them
+                covered = self._dirty
+            try:
+                with self.session_factory() as db:
+                    rows = db.execute(text("SELECT id, name, description FROM features ORDER BY id")).fetchall()
+                index = self._build(rows)
+            except Exception as e:
+                logger.error("Search index build failed: %s", e)
+                with self._lock:
+                    self._building = False
+                    self._error = e
+                    self._built.notify_all()
+                return
+            with self._lock:
+                self._index = index
+                self._error = None
+                self._dirty = self._dirty - covered
+                if not self._build_again:
+                    self._building = False
+                    self._built.notify_all()
+                    return
+
+    def _snapshot(self):
+        with self._lock:
+            if self._index is None:
+                self._start_build()
+                while self._index is None and self._building:
+                    self._built.wait()
+                if self._index is None:
+                    error, self._error = self._error, None
+                    raise RuntimeError("search index build failed") from error
+            return self._index, self._dirty, self._overlay
+
+    def _overlay_for(self, dirty: FrozenSet[int], overlay):
+        if overlay is not None and overlay[0] is dirty:
+            return overlay[1]
+        statement = text("SELECT id, name, description FROM features WHERE id IN :ids ORDER BY id")
+        statement = statement.bindparams(bindparam("ids", expanding=True))
+        with self.session_factory() as db:
+            rows = db.execute(statement, {"ids": sorted(dirty)}).fetchall()
+        index = self._build(rows)
+        with self._lock:
+            if self._dirty is dirty:
+                self._overlay = (dirty, index)
+        return index
+
+    @staticmethod
+    def _build(rows: Iterable[Tuple[int, Optional[str], Optional[str]]]):
+        ids, names, descriptions = [], [], []
+        for feature_id, name, description in rows:
+            ids.append(feature_id)
+            names.append((name or "").lower())
+            descriptions.append((description or "").lower())
+        # Prefix matches are a contiguous run of the names in sorted order
+        order = sorted(range(len(names)), key=lambda i: (names[i], ids[i]))
+        return {
+            "ids": ids,
+            "sorted_names": [names[i] for i in order],
+            "name_order": order,
+            "name": _FieldIndex(names),
+            "description": _FieldIndex(descriptions),
+        }
+
+    def _ranked(self, index, q: str) -> Iterator[Tuple[tuple, int]]:
+        """Sort keys and ids of the matching rows, best first.
+
+        The keys order rows the same way across indexes, so the snapshot's
+        and the overlay's results merge into one ranking.
+        """
+        ids, names = index["ids"], index["name"].values
+        lo = bisect.bisect_left(index["sorted_names"], q)
+        hi = bisect.bisect_left(index["sorted_names"], q + "\U0010ffff")
+        for i in index["name_order"][lo:hi]:
+            yield (0, names[i], ids[i]), ids[i]
+        for i in index["name"].containing(q):
+            if not names[i].startswith(q):
+                yield (1, ids[i]), ids[i]
+        for i in index["description"].containing(q):
+            if q not in names[i]:
+                yield (2, ids[i]), ids[i]
+
+        grams = trigrams(q)
+        name_rows, name_scores = index["name"].similar(grams, self.threshold)
+        description_rows, description_scores = index["description"].similar(grams, self.threshold)
+        rows = np.concatenate([name_rows, description_rows])
+        scores = np.concatenate([name_scores, description_scores])
+        order = np.lexsort((rows, -scores))
+        # A row matching in both fields keeps its better score: the first
+        # occurrence in ranked order
+        _, first = np.unique(rows[order], return_index=True)
+        picked = order[np.sort(first)]
+        descriptions = index["description"].values
+        for i, score in zip(rows[picked].tolist(), scores[picked].tolist()):
+            # Substring matches were already yielded above
+            if q not in names[i] and q not in descriptions[i]:
+                yield (3, -score, ids[i]), ids[i]
+
+    def query(self, q: str, limit: int, offset: int = 0) -> List[int]:
+        """Ids of the features matching q, best first.
+
+        Reads through its own sessions and can block on the first build,
+        so call it off the event loop.
+        """
+        index, dirty, overlay = self._snapshot()
+        q = normalize_query(q)
+        ranked = self._ranked(index, q)
+        if dirty:
+            ranked = heapq.merge(
+                (match for match in ranked if match[1] not in dirty),
+                self._ranked(self._overlay_for(dirty, overlay), q),
+            )
+        return [feature_id for _, feature_id in itertools.islice(ranked, offset, offset + limit)]
@@ -0,0 +1,285 @@
+import itertools
+import json
+from typing import Any, Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from FastAPI.metrics import phase
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+FeatureRow = Tuple[int, str, Optional[str], Any]
+
+FEATURE_COLLECTION_HEAD = b'{"type": "FeatureCollection", "features": ['
+FEATURE_COLLECTION_TAIL = b']}'
+
+
+def dumps(value: Any) -> str:
+    """Encode value as JSON text, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def geometry_json(value: Any) -> str:
+    """Return stored geometry as GeoJSON text without decoding it.
+
+    The API's read queries select the JSON column as text, so the stored
+    document is spliced in as-is. A geometry that comes back decoded (a
+    dict from a raw query) is encoded once here.
+    """
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, str):
+        return value
+    return dumps(value)
+
+
+def _map_positions(coordinates: Any, positions, position):
+    """Apply positions() to every array of positions in a coordinates tree.
+
+    A Point's coordinates are a single position and go through position().
+    """
+    if not coordinates:
+        return coordinates
+    first = coordinates[0]
+    if isinstance(first, (int, float)):
+        return position(coordinates)
+    # Empty lines and rings say nothing about the nesting; look past them
+    sample = next((part for part in coordinates if part), None)
+    if sample is None:
+        return coordinates
+    if isinstance(sample[0], (int, float)):
+        return positions(coordinates)
+    return [_map_positions(part, positions, position) for part in coordinates]
+
+
+def _map_geometry(geometry: Dict[str, Any], positions, position) -> Dict[str, Any]:
+    if geometry.get("type") == "GeometryCollection":
+        parts = [_map_geometry(part, positions, position) for part in geometry.get("geometries", [])]
+        return {**geometry, "geometries": parts}
+    if "coordinates" not in geometry:
+        return geometry
+    return {**geometry, "coordinates": _map_positions(geometry["coordinates"], positions, position)}
+
+
+def _quantize_geometry(geometry: Any, precision: int, delta: bool) -> Dict[str, Any]:
+    """Round every coordinate of a GeoJSON geometry to precision decimals.
+
+    With delta, coordinates become integers in units of 10**-precision, and
+    every position after the first of each line or ring holds the
+    difference from the one before it, as in vector tiles. Small deltas
+    take far fewer digits than absolute coordinates. A line mixing 2D and
+    3D positions is delta-encoded in 2D.
+
+    Lines and rings come back as numpy arrays; encode with _dumps_arrays().
+    """
+    import numpy as np
+
+    if isinstance(geometry, (str, bytes)):
+        with phase("decode"):
+            geometry = orjson.loads(geometry) if orjson is not None else json.loads(geometry)
+    scale = 10 ** precision
+
+    def position(values):
+        if delta:
+            return [int(round(v * scale)) for v in values]
+        return [round(v, precision) for v in values]
+
+    def positions(values):
+        # fromiter over the flattened positions is several times faster
+        # than np.asarray on a list of lists
+        width = len(values[0])
+        array = np.fromiter(itertools.chain.from_iterable(values), dtype=float)
+        if array.size != len(values) * width:
+            if not delta:
+                return [position(p) for p in values]
+            width = 2
+            array = np.fromiter(itertools.chain.from_iterable(p[:2] for p in values), dtype=float)
+        array = array.reshape(-1, width)
+        if not delta:
+            return np.round(array, precision)
+        array = np.rint(array * scale).astype(np.int64)
+        array[1:] = np.diff(array, axis=0)
+        return array
+
+    return _map_geometry(geometry, positions, position)
+
+
+def _dumps_arrays(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(value, default=lambda array: array.tolist())
+
+
+def encode_geometry(geometry: Any, precision: Optional[int] = None, delta: bool = False) -> str:
+    """GeoJSON text of stored geometry, rounded to precision decimals if given.
+
+    Without a precision the stored text is spliced in untouched.
+    """
+    if precision is None:
+        return geometry_json(geometry)
+    return _dumps_arrays(_quantize_geometry(geometry, precision, delta))
+
+
+def record_json(feature_id: int, name: str, description: Optional[str], geometry: Any,
+                precision: Optional[int] = None) -> str:
+    """Encode one row in the /api/features/ record shape, geometry spliced in."""
+    return (
+        f'{{"id": {feature_id}, "name": {dumps(name)}, '
+        f'"description": {dumps(description)}, "geometry": {encode_geometry(geometry, precision)}}}'
+    )
+
+
+def record_list_json(rows: Iterable[FeatureRow], precision: Optional[int] = None) -> bytes:
+    """Encode rows as a JSON array of feature records."""
+    return ("[" + ",".join(record_json(*row, precision=precision) for row in rows) + "]").encode()
+
+
+def feature_json(feature_id: int, name: str, description: Optional[str], geometry: Any,
+                 precision: Optional[int] = None, delta: bool = False) -> str:
+    """Encode one row as a GeoJSON Feature, splicing the geometry text in."""
+    properties = dumps({"id": feature_id, "name": name, "description": description})
+    return (
+        f'{{"type": "Feature", "id": {feature_id}, '
+        f'"properties": {properties}, "geometry": {encode_geometry(geometry, precision, delta)}}}'
+    )
+
+
+def feature_collection_head(precision: Optional[int] = None, delta: bool = False) -> bytes:
+    """Opening bytes of a FeatureCollection.
+
+    Delta-encoded collections say how to decode their coordinates in a
+    foreign "quantization" member: divide the running sums by 10**precision.
+    """
+    if not delta:
+        return FEATURE_COLLECTION_HEAD
+    quantization = dumps({"precision": precision, "delta": True})
+    return f'{{"type": "FeatureCollection", "quantization": {quantization}, "features": ['.encode()
+
+
+def stream_feature_collection(rows: Iterable[FeatureRow], chunk_size: int = 500,
+                              precision: Optional[int] = None, delta: bool = False) -> Iterator[bytes]:
+    """Yield a GeoJSON FeatureCollection in chunks of chunk_size features.
+
+    The header goes out before the first row is read, and only one chunk of
+    encoded features is held in memory at a time. delta requires a precision.
+    """
+    yield feature_collection_head(precision, delta)
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(feature_json(*row, precision=precision, delta=delta))
+        if len(chunk) >= chunk_size:
+            yield (("" if first else ",") + ",".join(chunk)).encode()
+            first = False
+            chunk = []
+    if chunk:
+        yield (("" if first else ",") + ",".join(chunk)).encode()
+    yield FEATURE_COLLECTION_TAIL
+
+
+class _JSONStream:
+    """Incremental reader over a text stream for walking one JSON document."""
+
+    def __init__(self, fileobj: IO[str], read_size: int):
+        self.fileobj = fileobj
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(size or self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer stays about one chunk
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def next_char(self) -> str:
+        """Consume and return the next non-whitespace character ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                self.pos += 1
+                return self.buf[self.pos - 1]
+            if not self._fill():
+                return ""
+
+    def peek_char(self) -> str:
+        char = self.next_char()
+        if char:
+            self.pos -= 1
+        return char
+
+    def expect(self, expected: str):
+        char = self.next_char()
+        if char != expected:
+            raise ValueError(f"Expected {expected!r} in GeoJSON, got {char!r}")
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek_char()
+        # Values larger than a chunk are retried with doubling reads, so a
+        # huge geometry costs O(n) re-parsing rather than O(n^2)
+        size = self.read_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                size *= 2
+                if self._fill(size):
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_feature_collection(fileobj: IO[str], read_size: int = 1 << 16,
+                            members: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the features of a GeoJSON FeatureCollection one at a time.
+
+    Only the feature being decoded and one read_size chunk are held in
+    memory, so the file size doesn't matter. Other top-level members
+    (type, crs, name, ...) are decoded and skipped, or stored in members
+    as they are read if a dict is passed.
+    """
+    stream = _JSONStream(fileobj, read_size)
+    stream.expect("{")
+    if stream.peek_char() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "features":
+            stream.expect("[")
+            if stream.peek_char() == "]":
+                stream.next_char()
+            else:
+                while True:
+                    yield stream.value()
+                    char = stream.next_char()
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"Expected ',' or ']' in features array, got {char!r}")
+        elif members is not None:
+            members[key] = stream.value()
+        else:
+            stream.value()
+        char = stream.next_char()
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or '}}' in GeoJSON object, got {char!r}")
@@ -0,0 +1,105 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from FastAPI.spatial import load_geometry
+
+logger = logging.getLogger(__name__)
+
+# Zoom levels we precompute simplified geometry for. A request for zoom z is
+# served from the smallest level >= z, so the tolerance is never coarser
+# than one screen pixel; above the last level the full geometry is used.
+LOD_ZOOMS = (4, 6, 8, 10, 12)
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Size of one 256px web map tile pixel at this zoom, in degrees."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def lod_for_zoom(zoom: Optional[int]) -> Optional[int]:
+    """Precomputed level to serve for a requested zoom, or None for full detail."""
+    if zoom is None:
+        return None
+    for level in LOD_ZOOMS:
+        if level >= zoom:
+            return level
+    return None
+
+
+def simplify_batch(geometry_texts: List[str]) -> List[Dict[int, str]]:
+    """Simplify many GeoJSON geometry texts for every level in LOD_ZOOMS.
+
+    Runs shapely's vectorized Douglas-Peucker over the whole batch. Results
+    that come out invalid or collapsed are redone with the slower
+    topology-preserving variant. Returns GeoJSON text per level for each
+    input; an empty dict means the geometry couldn't be parsed, and readers
+    fall back to the full geometry.
+    """
+    import numpy as np
+    import shapely
+
+    try:
+        geoms = shapely.from_geojson(geometry_texts)
+    except Exception:
+        # Parse one by one so a single bad geometry doesn't sink the batch
+        geoms = []
+        for geometry_text in geometry_texts:
+            try:
+                geoms.append(shapely.from_geojson(geometry_text))
+            except Exception as e:
+                logger.warning("Could not simplify geometry: %s", e)
+                geoms.append(None)
+        geoms = np.array(geoms, dtype=object)
+
+    results: List[Dict[int, str]] = [{} for _ in geometry_texts]
+    parsed = ~shapely.is_missing(geoms)
+    if not parsed.any():
+        return results
+    source = geoms[parsed]
+    for level in LOD_ZOOMS:
+        tolerance = zoom_tolerance(level)
+        simplified = shapely.simplify(source, tolerance, preserve_topology=False)
+        broken = ~shapely.is_valid(simplified) | (shapely.is_empty(simplified) & ~shapely.is_empty(source))
+        if broken.any():
+            simplified[broken] = shapely.simplify(source[broken], tolerance, preserve_topology=True)
+        for index, geometry_text in zip(np.flatnonzero(parsed), shapely.to_geojson(simplified)):
+            results[index][level] = geometry_text
+    return results
+
+
+def simplified_levels(geometry: Dict[str, Any]) -> Dict[int, str]:
+    """Simplified GeoJSON text per level in LOD_ZOOMS for one geometry."""
+    return simplify_batch([json.dumps(geometry)])[0]
+
+
+def ensure_simplified_levels(engine, batch_size: int = 200):
+    """Precompute simplified levels for features that have none yet."""
+    insert = text(
+        "INSERT INTO feature_simplified (feature_id, level, geometry) "
+        "VALUES (:feature_id, :level, :geometry)"
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT id, geometry FROM features f WHERE id > :last_id "
+                    "AND NOT EXISTS (SELECT 1 FROM feature_simplified s WHERE s.feature_id = f.id) "
+                    "ORDER BY id LIMIT :batch"
+                ),
+                {"last_id": last_id, "batch": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            levels = simplify_batch([json.dumps(load_geometry(geometry)) for _, geometry in rows])
+            params = [
+                {"feature_id": feature_id, "level": level, "geometry": simplified}
+                for (feature_id, _), feature_levels in zip(rows, levels)
+                for level, simplified in feature_levels.items()
+            ]
+            if params:
+                connection.execute(insert, params)
+            last_id = rows[-1][0]
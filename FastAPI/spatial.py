@@ -0,0 +1,191 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+Envelope = Tuple[float, float, float, float]
+
+ENVELOPE_COLUMNS = ("min_x", "min_y", "max_x", "max_y")
+
+# Expression the Postgres GiST index is built on; bbox queries must use the
+# same expression for the planner to pick the index up.
+POSTGRES_ENVELOPE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_features_envelope_gist ON features "
+    "USING gist (box(point(min_x, min_y), point(max_x, max_y)))"
+)
+# Elsewhere a B-tree on the envelope narrows bbox range predicates by min_x
+# and checks the other bounds from the index without reading the rows
+ENVELOPE_INDEX = "CREATE INDEX IF NOT EXISTS ix_features_envelope ON features (min_x, max_x, min_y, max_y)"
+
+
+# Array nesting above the positions, per GeoJSON geometry type
+COORDINATE_DEPTHS = {
+    "Point": 0, "MultiPoint": 1, "LineString": 1,
+    "MultiLineString": 2, "Polygon": 2, "MultiPolygon": 3,
+}
+
+
+def _check_coordinates(coordinates: Any, depth: int):
+    if not isinstance(coordinates, list):
+        raise ValueError("coordinates must be nested arrays")
+    if depth == 0:
+        if len(coordinates) < 2 or not all(
+                isinstance(v, (int, float)) and not isinstance(v, bool) for v in coordinates):
+            raise ValueError("each position must be an array of at least two numbers")
+        return
+    for part in coordinates:
+        _check_coordinates(part, depth - 1)
+
+
+def validate_geometry(geometry: Dict[str, Any]) -> Dict[str, Any]:
+    """Check that a GeoJSON geometry is well formed; raises ValueError if not.
+
+    Only the structure is checked (type, array nesting, positions of at
+    least two numbers), which is what envelopes and simplification rely on.
+    """
+    geometry_type = geometry.get("type")
+    if geometry_type == "GeometryCollection":
+        parts = geometry.get("geometries")
+        if not isinstance(parts, list) or not all(isinstance(part, dict) for part in parts):
+            raise ValueError("GeometryCollection needs a geometries array of geometries")
+        for part in parts:
+            validate_geometry(part)
+        return geometry
+    if geometry_type not in COORDINATE_DEPTHS:
+        raise ValueError(f"unknown geometry type {geometry_type!r}")
+    _check_coordinates(geometry.get("coordinates"), COORDINATE_DEPTHS[geometry_type])
+    return geometry
+
+
+def geometry_envelope(geometry: Dict[str, Any]) -> Optional[Envelope]:
+    """Return (min_x, min_y, max_x, max_y) of a GeoJSON geometry, or None if empty."""
+    min_x = min_y = float("inf")
+    max_x = max_y = float("-inf")
+
+    stack: List[Any] = []
+    geometries = [geometry]
+    while geometries:
+        geom = geometries.pop()
+        if geom.get("type") == "GeometryCollection":
+            geometries.extend(geom.get("geometries") or [])
+        else:
+            stack.append(geom.get("coordinates"))
+
+    while stack:
+        item = stack.pop()
+        if not item:
+            continue
+        if isinstance(item[0], (int, float)):
+            if len(item) < 2:
+                raise ValueError("each position must have at least two coordinates")
+            x, y = item[0], item[1]
+            if x < min_x:
+                min_x = x
+            if x > max_x:
+                max_x = x
+            if y < min_y:
+                min_y = y
+            if y > max_y:
+                max_y = y
+        else:
+            stack.extend(item)
+
+    if min_x == float("inf"):
+        return None
+    return (min_x, min_y, max_x, max_y)
+
+
+def load_geometry(value: Any) -> Dict[str, Any]:
+    """Decode a stored geometry value into a GeoJSON dict.
+
+    Depending on the driver and the query a read yields a dict or the JSON
+    text of the document. Rows written before ensure_geometry_objects()
+    may hold a JSON string wrapping that text, which is unwrapped too.
+    """
+    while isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    return value
+
+
+def ensure_geometry_objects(engine):
+    """Store every features.geometry as a JSON object.
+
+    The API used to write json.dumps() output through the JSON column type,
+    which stores a JSON string holding the GeoJSON text, while the bulk
+    loaders store the object itself. Strings are unwrapped in place, so
+    reads can select geometry::text and splice it into responses as-is.
+    """
+    if engine.dialect.name == "postgresql":
+        statement = "UPDATE features SET geometry = (geometry #>> '{}')::json WHERE json_typeof(geometry) = 'string'"
+    elif engine.dialect.name == "sqlite":
+        statement = "UPDATE features SET geometry = json_extract(geometry, '$') WHERE json_type(geometry) = 'text'"
+    else:
+        return
+    with engine.begin() as connection:
+        migrated = connection.execute(text(statement)).rowcount
+    if migrated:
+        logger.info("Converted %s features.geometry values from JSON strings to objects", migrated)
+
+
+def envelope_columns(geometry: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Envelope of a geometry as a dict of Feature column values."""
+    envelope = geometry_envelope(geometry) or (None, None, None, None)
+    return dict(zip(ENVELOPE_COLUMNS, envelope))
+
+
+def parse_bbox(bbox: str) -> Envelope:
+    """Parse a 'minx,miny,maxx,maxy' query string value."""
+    parts = bbox.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be minx,miny,maxx,maxy")
+    min_x, min_y, max_x, max_y = (float(p) for p in parts)
+    if min_x > max_x or min_y > max_y:
+        raise ValueError("bbox min values must not exceed max values")
+    return (min_x, min_y, max_x, max_y)
+
+
+def ensure_envelope_schema(engine, batch_size: int = 500):
+    """Add and backfill envelope columns on an existing features table.
+
+    Tables created before the envelope columns existed are upgraded in
+    place, and the envelope index (GiST on Postgres) is created.
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns("features")}
+    is_postgres = engine.dialect.name == "postgresql"
+    float_type = "DOUBLE PRECISION" if is_postgres else "FLOAT"
+
+    with engine.begin() as connection:
+        for column in ENVELOPE_COLUMNS:
+            if column not in existing:
+                connection.execute(text(f"ALTER TABLE features ADD COLUMN {column} {float_type}"))
+                logger.info("Added envelope column features.%s", column)
+        connection.execute(text(POSTGRES_ENVELOPE_INDEX if is_postgres else ENVELOPE_INDEX))
+
+    # Backfill rows written before envelopes were computed on insert
+    update = text(
+        "UPDATE features SET min_x = :min_x, min_y = :min_y, "
+        "max_x = :max_x, max_y = :max_y WHERE id = :id"
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT id, geometry FROM features "
+                    "WHERE min_x IS NULL AND id > :last_id ORDER BY id LIMIT :batch"
+                ),
+                {"last_id": last_id, "batch": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            params = []
+            for feature_id, geometry in rows:
+                columns = envelope_columns(load_geometry(geometry))
+                if columns["min_x"] is not None:
+                    params.append({"id": feature_id, **columns})
+            if params:
+                connection.execute(update, params)
+            last_id = rows[-1][0]
@@ -0,0 +1,354 @@
+import math
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXTENT = 4096
+# Clip a little outside the tile so strokes don't show seams at tile edges
+BUFFER = 64
+LAYER_NAME = "features"
+MAX_ZOOM = 22
+
+# MVT geometry types and commands (vector-tile-spec 2.1)
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Lon/lat bounds (min_x, min_y, max_x, max_y) of a web mercator tile."""
+    n = 2 ** z
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+
+def tile_range(z: int, bounds: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+    """Inclusive (min_x, min_y, max_x, max_y) tile indexes covering lon/lat bounds."""
+    n = 2 ** z
+
+    def tile_x(lon):
+        return min(max(int((lon + 180.0) / 360.0 * n), 0), n - 1)
+
+    def tile_y(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        rad = math.radians(lat)
+        return min(max(int((1 - math.asinh(math.tan(rad)) / math.pi) / 2 * n), 0), n - 1)
+
+    min_x, min_y, max_x, max_y = bounds
+    return tile_x(min_x), tile_y(max_y), tile_x(max_x), tile_y(min_y)
+
+
+# Protobuf wire encoding, just enough for the vector tile schema
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 31)
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field: int, value: bytes) -> bytes:
+    return _varint((field << 3) | 2) + _varint(len(value)) + value
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _field_bytes(field, b"".join(_varint(v) for v in values))
+
+
+class _Cursor:
+    """Encodes MVT geometry commands relative to the previous point."""
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.commands: List[int] = []
+
+    def _deltas(self, points):
+        for px, py in points:
+            self.commands.append(_zigzag(px - self.x))
+            self.commands.append(_zigzag(py - self.y))
+            self.x, self.y = px, py
+
+    def move_to(self, points):
+        self.commands.append((MOVE_TO & 0x7) | (len(points) << 3))
+        self._deltas(points)
+
+    def line_to(self, points):
+        self.commands.append((LINE_TO & 0x7) | (len(points) << 3))
+        self._deltas(points)
+
+    def close_path(self):
+        self.commands.append((CLOSE_PATH & 0x7) | (1 << 3))
+
+
+def _quantize(coords) -> List[Tuple[int, int]]:
+    """Round tile coordinates and drop consecutive duplicate points."""
+    points: List[Tuple[int, int]] = []
+    for cx, cy in coords:
+        point = (int(round(cx)), int(round(cy)))
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+def _ring_area(points) -> float:
+    return sum(
+        x1 * y2 - x2 * y1
+        for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1])
+    )
+
+
+def _encode_geometry(geom) -> Optional[Tuple[int, List[int]]]:
+    """MVT (type, commands) for a shapely geometry already in tile coordinates."""
+    cursor = _Cursor()
+    kind = geom.geom_type
+    if kind in ("Point", "MultiPoint"):
+        parts = [geom] if kind == "Point" else list(geom.geoms)
+        points = [_quantize(part.coords)[0] for part in parts if not part.is_empty]
+        if not points:
+            return None
+        cursor.move_to(points)
+        return POINT, cursor.commands
+
+    if kind in ("LineString", "MultiLineString"):
+        parts = [geom] if kind == "LineString" else list(geom.geoms)
+        for part in parts:
+            points = _quantize(part.coords)
+            if len(points) < 2:
+                continue
+            cursor.move_to(points[:1])
+            cursor.line_to(points[1:])
+        return (LINESTRING, cursor.commands) if cursor.commands else None
+
+    if kind in ("Polygon", "MultiPolygon"):
+        parts = [geom] if kind == "Polygon" else list(geom.geoms)
+        for part in parts:
+            exterior = _quantize(part.exterior.coords)[:-1]
+            if len(exterior) < 3 or _ring_area(exterior) == 0:
+                continue
+            rings = [(exterior, True)]
+            rings.extend((_quantize(ring.coords)[:-1], False) for ring in part.interiors)
+            for points, is_exterior in rings:
+                if len(points) < 3:
+                    continue
+                # Exterior rings have positive area in tile coordinates
+                # (clockwise on screen), interior rings negative
+                if (_ring_area(points) > 0) != is_exterior:
+                    points = points[::-1]
+                cursor.move_to(points[:1])
+                cursor.line_to(points[1:])
+                cursor.close_path()
+        return (POLYGON, cursor.commands) if cursor.commands else None
+
+    if kind == "GeometryCollection":
+        # MVT features carry one geometry type; keep the first encodable part
+        for part in geom.geoms:
+            encoded = _encode_geometry(part)
+            if encoded:
+                return encoded
+    return None
+
+
+def encode_tile(z: int, x: int, y: int, rows: Iterable[Tuple[int, str, Optional[str], Dict[str, Any]]]) -> bytes:
+    """Encode (id, name, description, geometry) rows into one MVT layer.
+
+    Geometries are clipped to the tile plus a small buffer, projected to
+    web mercator tile coordinates and quantized to the tile extent.
+    """
+    import numpy as np
+    import shapely
+    from shapely.geometry import shape
+
+    n = 2 ** z
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    pad_x = (max_lon - min_lon) * BUFFER / EXTENT
+    pad_y = (max_lat - min_lat) * BUFFER / EXTENT
+
+    def to_tile(coords):
+        lon = coords[:, 0]
+        lat = coords[:, 1].clip(-85.0511, 85.0511)
+        mx = ((lon + 180.0) / 360.0 * n - x) * EXTENT
+        rad = lat * math.pi / 180.0
+        my = ((1 - np.arcsinh(np.tan(rad)) / math.pi) / 2 * n - y) * EXTENT
+        return np.column_stack([mx, my])
+
+    keys: List[str] = []
+    key_index: Dict[str, int] = {}
+    values: List[str] = []
+    value_index: Dict[str, int] = {}
+
+    def tag(key, value):
+        if key not in key_index:
+            key_index[key] = len(keys)
+            keys.append(key)
+        if value not in value_index:
+            value_index[value] = len(values)
+            values.append(value)
+        return key_index[key], value_index[value]
+
+    features = []
+    for feature_id, name, description, geometry in rows:
+        try:
+            geom = shapely.clip_by_rect(
+                shape(geometry),
+                min_lon - pad_x, min_lat - pad_y, max_lon + pad_x, max_lat + pad_y
+            )
+        except Exception as e:
+            logger.warning("Skipping feature %s in tile %s/%s/%s: %s", feature_id, z, x, y, e)
+            continue
+        if geom.is_empty:
+            continue
+        encoded = _encode_geometry(shapely.transform(geom, to_tile))
+        if not encoded:
+            continue
+        geom_type, commands = encoded
+
+        tags: List[int] = []
+        for key, value in (("name", name), ("description", description)):
+            if value is not None:
+                tags.extend(tag(key, value))
+
+        feature = _field_varint(1, feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _field_varint(3, geom_type) + _packed(4, commands)
+        features.append(feature)
+
+    if not features:
+        return b""
+
+    layer = _field_varint(15, 2) + _field_bytes(1, LAYER_NAME.encode())
+    layer += b"".join(_field_bytes(2, f) for f in features)
+    layer += b"".join(_field_bytes(3, k.encode()) for k in keys)
+    layer += b"".join(_field_bytes(4, _field_bytes(1, v.encode())) for v in values)
+    layer += _field_varint(5, EXTENT)
+    return _field_bytes(3, layer)
+
+
+class TileCache:
+    """LRU cache of encoded tiles with an optional on-disk second level.
+
+    Keys are (z, x, y). invalidate() drops every cached tile that overlaps
+    a feature envelope; it only looks at tiles that are actually cached, so
+    its cost is bounded by the cache size rather than the tile pyramid.
+    """
+
+    def __init__(self, max_tiles: int = 2048, directory: Optional[str] = None):
+        self.max_tiles = max_tiles
+        self.directory = directory
+        self._tiles: "OrderedDict[Tuple[int, int, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, z, x, y):
+        return os.path.join(self.directory, str(z), str(x), f"{y}.pbf")
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        key = (z, x, y)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+        if self.directory:
+            try:
+                with open(self._path(z, x, y), "rb") as f:
+                    tile = f.read()
+            except FileNotFoundError:
+                return None
+            self._remember(key, tile)
+            return tile
+        return None
+
+    def _remember(self, key, tile):
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def put(self, z: int, x: int, y: int, tile: bytes):
+        self._remember((z, x, y), tile)
+        if self.directory:
+            path = self._path(z, x, y)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial tile
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(tile)
+            os.replace(tmp_path, path)
+
+    def invalidate(self, envelope: Optional[Tuple[float, float, float, float]]):
+        """Drop cached tiles that intersect envelope (lon/lat bounds)."""
+        if envelope is None:
+            return
+
+        def padded_range(z):
+            # Tiles also draw features that fall inside their clip buffer
+            pad = 360.0 / 2 ** z * BUFFER / EXTENT
+            min_x, min_y, max_x, max_y = envelope
+            return tile_range(z, (min_x - pad, min_y - pad, max_x + pad, max_y + pad))
+
+        def covers(z, x, y):
+            min_x, min_y, max_x, max_y = padded_range(z)
+            return min_x <= x <= max_x and min_y <= y <= max_y
+
+        with self._lock:
+            for key in [k for k in self._tiles if covers(*k)]:
+                del self._tiles[key]
+
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for z_name in os.listdir(self.directory):
+            if not z_name.isdigit():
+                continue
+            min_x, min_y, max_x, max_y = padded_range(int(z_name))
+            z_dir = os.path.join(self.directory, z_name)
+            for x_name in os.listdir(z_dir):
+                if not x_name.isdigit() or not min_x <= int(x_name) <= max_x:
+                    continue
+                x_dir = os.path.join(z_dir, x_name)
+                for file_name in os.listdir(x_dir):
+                    y_name = file_name.split(".")[0]
+                    if file_name.endswith(".pbf") and y_name.isdigit() and min_y <= int(y_name) <= max_y:
+                        try:
+                            os.remove(os.path.join(x_dir, file_name))
+                        except FileNotFoundError:
+                            pass
+
+    def clear(self):
+        """Drop every cached tile, in memory and on disk."""
+        with self._lock:
+            self._tiles.clear()
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for z_name in os.listdir(self.directory):
+            z_dir = os.path.join(self.directory, z_name)
+            if not z_name.isdigit() or not os.path.isdir(z_dir):
+                continue
+            for x_name in os.listdir(z_dir):
+                x_dir = os.path.join(z_dir, x_name)
+                if not x_name.isdigit() or not os.path.isdir(x_dir):
+                    continue
+                for file_name in os.listdir(x_dir):
+                    if file_name.endswith(".pbf"):
+                        try:
+                            os.remove(os.path.join(x_dir, file_name))
+                        except FileNotFoundError:
+                            pass
@@ -0,0 +1,101 @@
+"""Throughput of the API under many concurrent clients.
+
+Start the API in one terminal, with or without the async database path:
+    uvicorn FastAPI.api:app --port 8000
+    DB_ASYNC=true uvicorn FastAPI.api:app --port 8000
+then run, from the repository root:
+    python benchmarks/bench_concurrency.py [--clients 100] [--seconds 10] [--mix read|write]
+
+Each client is a thread with its own HTTP session. The read mix alternates
+list pages and single-feature reads; the write mix adds one update for
+every four reads. Features are created up front if the table has fewer
+than --features rows. Requests that fail or time out count as errors.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def ensure_features(base_url, count):
+    response = requests.get(f"{base_url}/api/features/", params={"limit": count})
+    response.raise_for_status()
+    ids = [feature["id"] for feature in response.json()]
+    if len(ids) >= count:
+        return ids
+    operations = [
+        {"op": "create", "feature": {
+            "name": f"Bench {i}",
+            "geometry": {"type": "Point", "coordinates": [74.0 + i * 0.001, 13.0]}
+        }}
+        for i in range(count - len(ids))
+    ]
+    response = requests.post(f"{base_url}/api/features/batch", json={"operations": operations})
+    response.raise_for_status()
+    return ids + [result["id"] for result in response.json()["results"]]
+
+
+def client(base_url, ids, mix, deadline, timeout, latencies, errors):
+    session = requests.Session()
+    rng = random.Random()
+    step = 0
+    while time.perf_counter() < deadline:
+        step += 1
+        feature_id = rng.choice(ids)
+        started = time.perf_counter()
+        try:
+            if mix == "write" and step % 5 == 0:
+                response = session.put(f"{base_url}/api/features/{feature_id}", json={
+                    "name": f"Bench {feature_id}",
+                    "geometry": {"type": "Point", "coordinates": [74.0 + rng.random(), 13.0]}
+                }, timeout=timeout)
+            elif step % 2:
+                response = session.get(f"{base_url}/api/features/", params={"limit": 20, "after_id": feature_id},
+                                       timeout=timeout)
+            else:
+                response = session.get(f"{base_url}/api/features/{feature_id}", timeout=timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        if not ok:
+            errors.append(1)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--features", type=int, default=1000)
+    parser.add_argument("--mix", choices=("read", "write"), default="read")
+    parser.add_argument("--timeout", type=float, default=10, help="per-request timeout in seconds")
+    args = parser.parse_args()
+
+    ids = ensure_features(args.url, args.features)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.seconds
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for _ in range(args.clients):
+            pool.submit(client, args.url, ids, args.mix, deadline, args.timeout, latencies, errors)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{args.clients} clients, {args.mix} mix, {elapsed:.1f}s")
+    print(f"requests   {len(latencies):8d}  errors {len(errors)}")
+    print(f"throughput {(len(latencies) - len(errors)) / elapsed:8.0f} ok req/s")
+    if latencies:
+        print(f"latency    p50 {percentile(latencies, 0.5) * 1000:.1f} ms  "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Edit and read cost of the Flask GeoJSON service's storage.
+
+Run from the repository root:
+    python benchmarks/bench_feature_store.py [--features 20000] [--edits 200]
+
+Compares the old whole-file store (json.load and json.dump of the
+collection on every request) with the append-only FeatureStore, for
+single-feature updates and for reading the whole collection, both right
+after an edit and unchanged (served from the cached collection JSON).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "FastAPI", "automatation", "flask"))
+
+from feature_store import FeatureStore
+
+
+def synthetic_collection(features):
+    rng = random.Random(42)
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": f"Region {i}"}, "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[74 + rng.random(), 13 + rng.random()] for _ in range(30)]],
+        }}
+        for i in range(features)
+    ]}
+
+
+def timed(label, repeat, work):
+    started = time.perf_counter()
+    for i in range(repeat):
+        work(i)
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:36s} {elapsed * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=20000)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=10)
+    args = parser.parse_args()
+
+    collection = synthetic_collection(args.features)
+    feature = collection["features"][0]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "karnataka.geoJSON")
+    with open(path, "w") as file:
+        json.dump(collection, file)
+    print(f"{args.features} features, {os.path.getsize(path) / 1e6:.1f} MB")
+
+    def rewrite_edit(i):
+        with open(path) as file:
+            data = json.load(file)
+        data["features"][i % args.features] = feature
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+    def rewrite_read(i):
+        with open(path) as file:
+            json.dumps(json.load(file))
+
+    timed("whole file: update one feature", max(args.edits // 20, 1), rewrite_edit)
+    timed("whole file: read collection", args.reads, rewrite_read)
+
+    started = time.perf_counter()
+    store = FeatureStore(path + ".log", source=path)
+    print(f"{'feature log: import':36s} {(time.perf_counter() - started) * 1000:9.2f} ms")
+    timed("feature log: update one feature", args.edits, lambda i: store.replace(i % args.features, feature))
+    timed("feature log: update, then read", args.reads, lambda i: (store.replace(0, feature), store.collection()))
+    timed("feature log: read unchanged", args.edits, lambda i: store.collection())
+    timed("feature log: compact", 1, lambda i: store.compact())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare the old decode/re-encode read path with the spliced fast path.
+
+Run from the repository root:
+    python benchmarks/bench_geometry_encoding.py [vertices] [features]
+"""
+import json
+import math
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from FastAPI.serialization import orjson, record_list_json
+
+
+def make_multipolygon(vertices):
+    """A MultiPolygon of 10 rings with `vertices` points in total."""
+    per_ring = max(vertices // 10, 4)
+    polygons = []
+    for ring in range(10):
+        cx, cy = 74.0 + ring * 0.3, 12.0 + ring * 0.5
+        points = [
+            [cx + 0.1 * math.cos(2 * math.pi * i / per_ring),
+             cy + 0.1 * math.sin(2 * math.pi * i / per_ring)]
+            for i in range(per_ring)
+        ]
+        points.append(points[0])
+        polygons.append([points])
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def old_path(rows):
+    # What get_features did before: json.loads every geometry, then let
+    # FastAPI run jsonable_encoder and JSONResponse over the result
+    content = [
+        {"id": i, "name": n, "description": d, "geometry": json.loads(g)}
+        for i, n, d, g in rows
+    ]
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+def fast_path(rows):
+    return record_list_json(rows)
+
+
+def main():
+    vertices = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    features = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    geometry = json.dumps(make_multipolygon(vertices))
+    rows = [(i, f"Karnataka Region {i}", "benchmark", geometry) for i in range(1, features + 1)]
+
+    assert json.loads(old_path(rows)) == json.loads(fast_path(rows))
+
+    runs = 5
+    old = min(timeit.repeat(lambda: old_path(rows), number=1, repeat=runs))
+    fast = min(timeit.repeat(lambda: fast_path(rows), number=1, repeat=runs))
+    print(f"{features} features x {vertices} vertices, payload {len(geometry) * features / 1e6:.1f} MB")
+    print(f"orjson available: {orjson is not None}")
+    print(f"decode + jsonable_encoder: {old * 1000:9.1f} ms/request")
+    print(f"spliced geometry text:     {fast * 1000:9.1f} ms/request")
+    print(f"speedup:                   {old / fast:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
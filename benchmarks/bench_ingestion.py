@@ -0,0 +1,81 @@
+"""Scaling of the ingestion prepare step (reproject, make_valid, encode) with worker processes.
+
+Run from the repository root:
+    python benchmarks/bench_ingestion.py [--features 50000] [--vertices 40] [--workers 1 2 4 8]
+
+A synthetic GeoJSON file in UTM zone 43N (EPSG:32643), where one
+feature in ten is a self-intersecting bow tie, is streamed through the
+same parse -> prepare pipeline as scrips/data_ingestion.py, minus the
+COPY into Postgres. Parsing stays in the main process, so it bounds the
+achievable speedup.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root)
+sys.path.append(os.path.join(root, "scrips"))
+
+from data_ingestion import iter_prepared, iter_source_chunks
+
+
+def write_sample(path, features, vertices):
+    rng = random.Random(7)
+    with open(path, "w") as f:
+        f.write('{"type": "FeatureCollection", '
+                '"crs": {"type": "name", "properties": {"name": "EPSG:32643"}}, "features": [')
+        for i in range(features):
+            cx, cy = rng.uniform(500000, 800000), rng.uniform(1300000, 2000000)
+            ring = [
+                [cx + 500 * math.cos(2 * math.pi * k / vertices), cy + 500 * math.sin(2 * math.pi * k / vertices)]
+                for k in range(vertices)
+            ]
+            if i % 10 == 0:
+                # Swap two vertices across the ring to make it cross itself
+                ring[0], ring[vertices // 2] = ring[vertices // 2], ring[0]
+            ring.append(ring[0])
+            feature = {"type": "Feature", "properties": {"name": f"Region {i}", "index": i},
+                       "geometry": {"type": "Polygon", "coordinates": [ring]}}
+            f.write(("," if i else "") + json.dumps(feature))
+        f.write("]}")
+
+
+def run(path, chunk_size, workers):
+    started = time.perf_counter()
+    count = repaired = 0
+    with open(path) as stream:
+        for chunk in iter_prepared(iter_source_chunks(stream, chunk_size), workers):
+            count += chunk.count
+            repaired += chunk.repaired
+    return count, repaired, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=50000)
+    parser.add_argument("--vertices", type=int, default=40)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.features} features x {args.vertices} vertices")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sample.geojson")
+        write_sample(path, args.features, args.vertices)
+        baseline = None
+        for workers in args.workers:
+            count, repaired, elapsed = run(path, args.chunk_size, workers)
+            baseline = baseline or elapsed
+            print(f"workers {workers:3d}: {elapsed:7.2f} s  {count / elapsed:8.0f} features/s  "
+                  f"speedup {baseline / elapsed:4.2f}x  ({repaired} repaired)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare the old row-by-row loader with the batched COPY/INSERT loader.
+
+Needs the features tables to exist (start the API once) and the DB_*
+environment variables used by FastAPI/load_data.py. The features table
+is cleared on every run. From the repository root:
+    python benchmarks/bench_load_data.py [features] [vertices]
+"""
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pg8000
+from dotenv import load_dotenv
+
+from FastAPI.load_data import load_karnataka_data
+from FastAPI.simplification import simplified_levels
+from FastAPI.spatial import envelope_columns
+
+load_dotenv()
+
+
+def connect():
+    return pg8000.connect(
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT"))
+    )
+
+
+def write_sample(path, features, vertices):
+    with open(path, "w") as f:
+        f.write('{"type": "FeatureCollection", "features": [')
+        for i in range(features):
+            cx, cy = 74.0 + (i % 100) * 0.04, 11.5 + (i // 100) * 0.04
+            ring = [[cx + 0.01 * math.cos(2 * math.pi * k / vertices),
+                     cy + 0.01 * math.sin(2 * math.pi * k / vertices)] for k in range(vertices)]
+            ring.append(ring[0])
+            feature = {"type": "Feature", "properties": {},
+                       "geometry": {"type": "Polygon", "coordinates": [ring]}}
+            f.write(("," if i else "") + json.dumps(feature))
+        f.write("]}")
+
+
+def legacy_loop(path):
+    # The loader as it was: whole-file json.loads, one INSERT and four
+    # prints per feature
+    with open(path, "r") as f:
+        geojson_data = json.loads(f.read())
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM features")
+    for idx, feature in enumerate(geojson_data['features'], 1):
+        geometry = feature['geometry']
+        name = f"Karnataka Region {idx}"
+        description = f"Region {idx} in Karnataka with geometry type {geometry['type']}"
+        print(f"\nInserting feature {idx}:")
+        print(f"Name: {name}")
+        print(f"Geometry Type: {geometry['type']}")
+        print(f"First coordinate: {geometry['coordinates'][0][0] if geometry['coordinates'] else 'No coordinates'}")
+        cur.execute("""
+            INSERT INTO features (name, description, geometry)
+            VALUES (%s, %s, %s)
+        """, (name, description, json.dumps(geometry)))
+    conn.commit()
+    conn.close()
+
+
+def row_by_row(path):
+    # The old loop doing the same work as the bulk loader (envelopes and
+    # simplified levels), so the comparison isolates the write strategy
+    with open(path, "r") as f:
+        geojson_data = json.loads(f.read())
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM features")
+    for idx, feature in enumerate(geojson_data['features'], 1):
+        geometry = feature['geometry']
+        envelope = envelope_columns(geometry)
+        cur.execute("""
+            INSERT INTO features (name, description, geometry, min_x, min_y, max_x, max_y)
+            VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
+        """, (f"Karnataka Region {idx}", "", json.dumps(geometry),
+              envelope['min_x'], envelope['min_y'], envelope['max_x'], envelope['max_y']))
+        feature_id = cur.fetchone()[0]
+        for level, simplified in simplified_levels(geometry).items():
+            cur.execute(
+                "INSERT INTO feature_simplified (feature_id, level, geometry) VALUES (%s, %s, %s)",
+                (feature_id, level, simplified)
+            )
+    conn.commit()
+    conn.close()
+
+
+def timed(label, count, func, *args, **kwargs):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:8.2f}s {count / elapsed:10.0f} rows/s")
+
+
+def main():
+    features = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    vertices = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sample.geojson")
+        write_sample(path, features, vertices)
+        print(f"{features} polygons x {vertices} vertices, {os.path.getsize(path) / 1e6:.1f} MB")
+        timed("old loop, features only", features, legacy_loop, path)
+        timed("old loop + envelopes/levels", features, row_by_row, path)
+        for batch_size in (500, 5000):
+            timed(f"multi-row INSERT, batch {batch_size}", features,
+                  load_karnataka_data, path, batch_size, "insert")
+            timed(f"COPY, batch {batch_size}", features,
+                  load_karnataka_data, path, batch_size, "copy")
+
+
+if __name__ == "__main__":
+    main()
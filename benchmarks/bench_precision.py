@@ -0,0 +1,83 @@
+"""Payload size and encoding time of feature output by coordinate precision.
+
+Run from the repository root, on the Karnataka file or synthetic polygons:
+    python benchmarks/bench_precision.py [--path karnataka.geojson]
+    python benchmarks/bench_precision.py [--features 500] [--vertices 2000]
+
+Each row encodes the whole collection the way GET /api/features.geojson
+does and reports its size and encoding time, raw and gzipped (level 6,
+the API default).
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FastAPI.serialization import iter_feature_collection, orjson, stream_feature_collection
+
+VARIANTS = (
+    ("as stored", None, False),
+    ("precision=7", 7, False),
+    ("precision=6", 6, False),
+    ("precision=5", 5, False),
+    ("precision=4", 4, False),
+    ("precision=6 delta", 6, True),
+    ("precision=5 delta", 5, True),
+)
+
+
+def load_rows(path):
+    with open(path) as f:
+        return [
+            (i, f"Karnataka Region {i}", None, json.dumps(feature["geometry"]))
+            for i, feature in enumerate(iter_feature_collection(f), 1)
+        ]
+
+
+def synthetic_rows(features, vertices):
+    """Wobbly rings around Karnataka with full double precision coordinates."""
+    rng = random.Random(42)
+    rows = []
+    for i in range(1, features + 1):
+        cx, cy = rng.uniform(74.0, 78.5), rng.uniform(11.5, 18.5)
+        ring = [
+            [cx + 0.05 * math.cos(2 * math.pi * k / vertices) * rng.uniform(0.9, 1.1),
+             cy + 0.05 * math.sin(2 * math.pi * k / vertices) * rng.uniform(0.9, 1.1)]
+            for k in range(vertices)
+        ]
+        ring.append(ring[0])
+        rows.append((i, f"Karnataka Region {i}", None, json.dumps({"type": "Polygon", "coordinates": [ring]})))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", help="GeoJSON FeatureCollection to encode")
+    parser.add_argument("--features", type=int, default=500)
+    parser.add_argument("--vertices", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = load_rows(args.path) if args.path else synthetic_rows(args.features, args.vertices)
+    print(f"{len(rows)} features from {args.path or 'synthetic polygons'}, orjson available: {orjson is not None}")
+    print(f"{'':20s} {'MB':>8s} {'ms':>8s} {'gzip MB':>8s} {'+gzip ms':>9s}")
+    baseline = None
+    for label, precision, delta in VARIANTS:
+        def encode():
+            return b"".join(stream_feature_collection(rows, 500, precision, delta))
+        body = encode()
+        elapsed = min(timeit.repeat(encode, number=1, repeat=3))
+        compressed = min(timeit.repeat(lambda: gzip.compress(encode(), 6), number=1, repeat=3))
+        size = len(body)
+        baseline = baseline or size
+        print(f"{label:20s} {size / 1e6:8.2f} {elapsed * 1000:8.1f} "
+              f"{len(gzip.compress(body, 6)) / 1e6:8.2f} {compressed * 1000:9.1f}   {size / baseline:4.0%} of as stored")
+
+
+if __name__ == "__main__":
+    main()
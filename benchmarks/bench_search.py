@@ -0,0 +1,103 @@
+"""Query latency of the in-process trigram search index.
+
+Run from the repository root:
+    python benchmarks/bench_search.py [--features 1000000] [--limit 20] [--written 1000]
+
+Builds a TrigramIndex over synthetic place names and descriptions (the
+index GET /api/features/search uses where pg_trgm isn't available), then
+times a page of results for prefix, substring and fuzzy queries, common
+and rare: first against the built snapshot, then with --written features
+waiting for the next rebuild, searched from the table instead.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FastAPI.search import TrigramIndex
+
+SYLLABLES = ("ban", "ga", "lo", "re", "my", "so", "hu", "bli", "dhar", "wad", "kal", "bur", "gi", "ma", "nga",
+             "tu", "ku", "ru", "che", "nna", "pa", "tna", "hal", "li", "ko", "lar", "man", "dya", "ha", "ssan")
+QUERIES = (
+    ("prefix, common", "ban"),
+    ("prefix, rare", "bangalore"),
+    ("substring, common", "region"),
+    ("substring, rare", "dharwadkal"),
+    ("description", "polygon"),
+    ("fuzzy", "bengaluru"),
+    ("no match", "qqqzzz"),
+)
+
+
+class _Rows:
+    """Stands in for a session: hands the index its build rows, or the rows of some ids."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.selected = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, parameters=None):
+        # Ids are 1..len(rows)
+        self.selected = self.rows if parameters is None else [self.rows[i - 1] for i in parameters["ids"]]
+        return self
+
+    def fetchall(self):
+        return self.selected
+
+
+def synthetic_rows(features):
+    rng = random.Random(42)
+    rows = []
+    for i in range(1, features + 1):
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        if rng.random() < 0.3:
+            name += f" Region {i}"
+        kind = rng.choice(("Polygon", "MultiPolygon", "Point"))
+        rows.append((i, name, f"Region {i} in Karnataka with geometry type {kind}"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--written", type=int, default=1000)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.features)
+    index = TrigramIndex(lambda: _Rows(rows), rebuild_after=max(args.written, 1))
+    started = time.perf_counter()
+    index.query("warm up", 1)
+    print(f"built index over {len(rows)} features in {time.perf_counter() - started:.1f}s")
+
+    def run_queries():
+        print(f"{'query':28s} {'results':>7s} {'ms/query':>9s}")
+        for label, q in QUERIES:
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                ids = index.query(q, args.limit)
+            elapsed = (time.perf_counter() - started) / args.repeat
+            print(f"{label + ' (' + q + ')':28s} {len(ids):7d} {elapsed * 1000:9.2f}")
+
+    run_queries()
+    if args.written:
+        written = random.Random(7).sample(range(1, len(rows) + 1), min(args.written, len(rows)))
+        index.invalidate(written)
+        started = time.perf_counter()
+        index.query("warm up", 1)
+        print(f"\nread {len(written)} written features in {(time.perf_counter() - started) * 1000:.1f}ms")
+        run_queries()
+
+
+if __name__ == "__main__":
+    main()
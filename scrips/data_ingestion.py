@@ -1,110 +1,347 @@
-import os
-import requests
-import geopandas as gpd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
-import traceback
-
-# Load environment variables
-load_dotenv()
-
-def create_db_engine():
-    """Create database connection engine using environment variables."""
-    try:
-        db_params = {
-            'host': os.getenv('DB_HOST'),
-            'port': os.getenv('DB_PORT'),
-            'database': os.getenv('DB_NAME'),
-            'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD')
-        }
-        
-        # Print connection details (except password)
-        print(f"Connecting to database: {db_params['database']}")
-        print(f"Host: {db_params['host']}")
-        print(f"Port: {db_params['port']}")
-        print(f"User: {db_params['user']}")
-        
-        connection_string = f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}"
-        return create_engine(connection_string)
-    except Exception as e:
-        print(f"Error creating database engine: {str(e)}")
-        print(traceback.format_exc())
-        raise
-
-def fetch_geojson(url):
-    """Fetch GeoJSON data from the specified URL."""
-    try:
-        print(f"Fetching data from URL: {url}")
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        print(f"Successfully fetched data with {len(data['features'])} features")
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching GeoJSON data: {str(e)}")
-        print(traceback.format_exc())
-        return None
-
-def process_and_store_data(url, table_name):
-    """Main function to process and store GeoJSON data."""
-    try:
-        # Fetch GeoJSON data
-        geojson_data = fetch_geojson(url)
-        
-        if not geojson_data:
-            return False
-        
-        # Convert to GeoDataFrame
-        print("Converting to GeoDataFrame...")
-        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
-        print(f"Created GeoDataFrame with {len(gdf)} rows")
-        
-        # Ensure CRS is set to EPSG:4326 (WGS 84)
-        if gdf.crs is None:
-            print("Setting CRS to EPSG:4326...")
-            gdf.set_crs(epsg=4326, inplace=True)
-        else:
-            print(f"Converting from {gdf.crs} to EPSG:4326...")
-            gdf = gdf.to_crs(epsg=4326)
-        
-        # Create database connection
-        print("Creating database connection...")
-        engine = create_db_engine()
-        
-        # Store in PostgreSQL with PostGIS
-        print(f"Storing data in table '{table_name}'...")
-        gdf.to_postgis(
-            name=table_name,
-            con=engine,
-            if_exists='replace',
-            index=False
-        )
-        
-        print(f"Successfully stored {len(gdf)} records in table '{table_name}'")
-        return True
-        
-    except Exception as e:
-        print(f"Error processing or storing data: {str(e)}")
-        print(traceback.format_exc())
-        return False
-
-if __name__ == "__main__":
-    # Example using a public GeoJSON API (Natural Earth Data - Countries)
-    geojson_url = "https://raw.githubusercontent.com/datasets/geo-countries/master/data/countries.geojson"
-    table_name = "countries"
-    
-    success = process_and_store_data(geojson_url, table_name)
-    if success:
-        print("Data ingestion completed successfully")
-        
-        # Verify the data
-        try:
-            engine = create_db_engine()
-            with engine.connect() as connection:
-                result = connection.execute("SELECT COUNT(*) FROM countries").fetchone()
-                print(f"Verified {result[0]} records in the countries table")
-        except Exception as e:
-            print(f"Error verifying data: {str(e)}")
-    else:
-        print("Data ingestion failed")
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import requests
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, NamedTuple
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+import traceback
+
+# Add the project root to the Python path for the shared GeoJSON parser
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from FastAPI.serialization import iter_feature_collection
+from FastAPI.spatial import ENVELOPE_COLUMNS
+
+# Load environment variables
+load_dotenv()
+
+# Features parsed, reprojected and written per step. Memory use depends on
+# this, not on the size of the input.
+CHUNK_SIZE = 5000
+TARGET_EPSG = 4326
+GEOMETRY_COLUMN = "geometry"
+GEOMETRY_TYPE = f"geometry(Geometry, {TARGET_EPSG})"
+# Digest of each feature's properties and geometry, for change detection
+HASH_COLUMN = "content_hash"
+# Processes that reproject, repair and encode chunks; 1 does it in-process
+WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+def create_db_engine():
+    """Create database connection engine using environment variables."""
+    try:
+        db_params = {
+            'host': os.getenv('DB_HOST'),
+            'port': os.getenv('DB_PORT'),
+            'database': os.getenv('DB_NAME'),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+
+        # Print connection details (except password)
+        print(f"Connecting to database: {db_params['database']}")
+        print(f"Host: {db_params['host']}")
+        print(f"Port: {db_params['port']}")
+        print(f"User: {db_params['user']}")
+
+        connection_string = f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}"
+        return create_engine(connection_string)
+    except Exception as e:
+        print(f"Error creating database engine: {str(e)}")
+        print(traceback.format_exc())
+        raise
+
+@contextmanager
+def open_geojson(source):
+    """Open a GeoJSON file path or HTTP(S) URL as a text stream.
+
+    URLs are read as the response arrives rather than downloaded first.
+    """
+    if source.startswith(("http://", "https://")):
+        print(f"Streaming data from URL: {source}")
+        with requests.get(source, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            # Undo any Content-Encoding while reading
+            response.raw.decode_content = True
+            yield io.TextIOWrapper(response.raw, encoding="utf-8")
+    else:
+        print(f"Reading data from file: {source}")
+        with open(source, "r", encoding="utf-8") as f:
+            yield f
+
+def iter_chunks(features, chunk_size):
+    """Group an iterator of features into lists of at most chunk_size."""
+    features = iter(features)
+    while True:
+        chunk = list(itertools.islice(features, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def declared_crs(members):
+    """CRS named by a legacy GeoJSON "crs" member, or None."""
+    crs = members.get("crs") or {}
+    return (crs.get("properties") or {}).get("name")
+
+def chunk_frame(features, crs):
+    """GeoDataFrame of one chunk of features, reprojected to EPSG:4326."""
+    gdf = gpd.GeoDataFrame.from_features(features, crs=crs)
+    if gdf.crs.to_epsg() != TARGET_EPSG:
+        gdf = gdf.to_crs(epsg=TARGET_EPSG)
+    return gdf
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def column_type(series):
+    """Postgres type for a property column, as to_postgis would pick it."""
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(series):
+        return "bigint"
+    if pd.api.types.is_float_dtype(series):
+        return "double precision"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "timestamp"
+    return "text"
+
+def csv_value(value):
+    """One property value as COPY CSV text; None becomes the NULL marker."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and math.isnan(value)):
+        return r"\N"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, float) and value.is_integer():
+        # Integer columns turn float in chunks that have missing values;
+        # "3" loads into bigint and double precision columns alike
+        return int(value)
+    return value
+
+def content_hash(properties, geometry_wkb):
+    """Digest of a feature's properties and (prepared) geometry.
+
+    Properties are hashed as key-sorted JSON, so the digest doesn't depend
+    on key order or on which columns other features in the chunk have.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(properties or {}, sort_keys=True, default=str).encode())
+    digest.update(b"\0")
+    digest.update((geometry_wkb or "").encode())
+    return digest.hexdigest()
+
+class PreparedChunk(NamedTuple):
+    """A chunk ready for COPY: its property columns and CSV rows.
+
+    Each row holds the properties, the envelope columns, the content hash
+    and the EWKB hex geometry, in that order.
+    """
+    columns: Dict[str, str]
+    csv: str
+    count: int
+    repaired: int
+
+def prepare_chunk(features, crs):
+    """Reproject, repair and encode one chunk of GeoJSON features.
+
+    Invalid geometries are fixed with make_valid after reprojection, since
+    reprojecting can itself make rings self-intersect. Runs in worker
+    processes, so it takes and returns only plain picklable data.
+    """
+    gdf = chunk_frame(features, crs)
+    geometries = np.asarray(gdf.geometry.values)
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    if invalid.any():
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+    bounds = shapely.bounds(geometries)
+    wkb = shapely.to_wkb(shapely.set_srid(geometries, TARGET_EPSG), hex=True, include_srid=True)
+
+    columns = {name: column_type(gdf[name]) for name in gdf.columns if name != GEOMETRY_COLUMN}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = zip(features, gdf[list(columns)].itertuples(index=False, name=None), bounds, wkb)
+    for feature, values, envelope, geometry in rows:
+        writer.writerow([csv_value(v) for v in values]
+                        + [csv_value(v) for v in envelope.tolist()]
+                        + [content_hash(feature.get("properties"), geometry)]
+                        + [geometry if geometry is not None else r"\N"])
+    return PreparedChunk(columns, buffer.getvalue(), len(features), int(invalid.sum()))
+
+def iter_prepared(chunks, workers=WORKERS):
+    """Run prepare_chunk over (features, crs) pairs, yielding results in order.
+
+    With more than one worker the chunks go to a process pool. At most two
+    chunks per worker are in flight, so memory stays bounded while the
+    parser in this process keeps every worker busy.
+    """
+    if workers <= 1:
+        for features, crs in chunks:
+            yield prepare_chunk(features, crs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for features, crs in chunks:
+            pending.append(pool.submit(prepare_chunk, features, crs))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class PostGISWriter:
+    """Append prepared chunks to a table with COPY.
+
+    The table is (re)created from the first chunk's columns; properties
+    that first appear in a later chunk are added as new columns. Geometry
+    goes in as EWKB hex, which PostGIS parses on input, next to its
+    envelope in the same min_x/min_y/max_x/max_y columns the API uses and
+    its content hash.
+    """
+
+    def __init__(self, connection, table_name):
+        self.connection = connection
+        self.table_name = table_name
+        self.columns = None
+
+    def _create(self, columns):
+        self.columns = dict(columns)
+        definitions = [f"{quote_identifier(n)} {t}" for n, t in self.columns.items()]
+        definitions += [f"{c} double precision" for c in ENVELOPE_COLUMNS]
+        definitions.append(f"{HASH_COLUMN} text")
+        definitions.append(f"{GEOMETRY_COLUMN} {GEOMETRY_TYPE}")
+        self.connection.execute(text(f"DROP TABLE IF EXISTS {quote_identifier(self.table_name)}"))
+        self.connection.execute(text(
+            f"CREATE TABLE {quote_identifier(self.table_name)} ({', '.join(definitions)})"
+        ))
+
+    def _add_columns(self, columns):
+        for name, sql_type in columns.items():
+            if name in self.columns:
+                continue
+            self.columns[name] = sql_type
+            self.connection.execute(text(
+                f"ALTER TABLE {quote_identifier(self.table_name)} "
+                f"ADD COLUMN {quote_identifier(name)} {sql_type}"
+            ))
+
+    def write(self, chunk):
+        if self.columns is None:
+            self._create(chunk.columns)
+        else:
+            self._add_columns(chunk.columns)
+
+        columns = ", ".join(
+            [quote_identifier(n) for n in chunk.columns] + list(ENVELOPE_COLUMNS) + [HASH_COLUMN, GEOMETRY_COLUMN]
+        )
+        cursor = self.connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {quote_identifier(self.table_name)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                io.StringIO(chunk.csv)
+            )
+        finally:
+            cursor.close()
+
+    def create_spatial_index(self):
+        # Built once after loading, which is much cheaper than keeping it
+        # up to date through every COPY
+        self.connection.execute(text(
+            f"CREATE INDEX {quote_identifier(f'idx_{self.table_name}_{GEOMETRY_COLUMN}')} "
+            f"ON {quote_identifier(self.table_name)} USING gist ({GEOMETRY_COLUMN})"
+        ))
+
+def iter_source_chunks(stream, chunk_size, crs=None):
+    """Yield (features, source CRS) pairs of chunk_size features from a stream.
+
+    The source CRS is crs if given, else the file's "crs" member (if it
+    comes before the features), else EPSG:4326.
+    """
+    members = {}
+    source_crs = crs
+    for chunk in iter_chunks(iter_feature_collection(stream, members=members), chunk_size):
+        if source_crs is None:
+            source_crs = declared_crs(members) or f"EPSG:{TARGET_EPSG}"
+            print(f"Reprojecting from {source_crs} to EPSG:{TARGET_EPSG}")
+        yield chunk, source_crs
+    if crs is None and declared_crs(members) not in (None, source_crs):
+        raise ValueError(
+            f"GeoJSON declares CRS {declared_crs(members)} after its features; pass it explicitly with crs="
+        )
+
+def process_and_store_data(url, table_name, chunk_size=CHUNK_SIZE, crs=None, workers=WORKERS):
+    """Stream GeoJSON from a URL or file into table_name, replacing it.
+
+    Features are parsed incrementally, chunk_size at a time. Each chunk
+    is reprojected to EPSG:4326, repaired and encoded (on `workers`
+    processes when more than one), then COPYed in source order.
+    Everything happens in one transaction, so the table is replaced all
+    at once or not at all.
+    """
+    try:
+        started = time.perf_counter()
+        loaded = repaired = 0
+        engine = create_db_engine()
+        with open_geojson(url) as stream, engine.begin() as connection:
+            writer = PostGISWriter(connection, table_name)
+            chunks = iter_source_chunks(stream, chunk_size, crs)
+            for chunk in iter_prepared(chunks, workers):
+                writer.write(chunk)
+                loaded += chunk.count
+                repaired += chunk.repaired
+                print(f"Stored {loaded} features ({loaded / (time.perf_counter() - started):.0f} features/s)")
+
+            if writer.columns is None:
+                print("No features found in source")
+                return False
+            writer.create_spatial_index()
+
+        print(f"Successfully stored {loaded} records in table '{table_name}' "
+              f"in {time.perf_counter() - started:.1f}s ({repaired} invalid geometries repaired)")
+        return True
+
+    except Exception as e:
+        print(f"Error processing or storing data: {str(e)}")
+        print(traceback.format_exc())
+        return False
+
+if __name__ == "__main__":
+    # Example using a public GeoJSON API (Natural Earth Data - Countries)
+    parser = argparse.ArgumentParser(description="Stream a GeoJSON file or URL into a PostGIS table")
+    parser.add_argument(
+        "source", nargs="?",
+        default="https://raw.githubusercontent.com/datasets/geo-countries/master/data/countries.geojson"
+    )
+    parser.add_argument("--table", default="countries")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--crs", help="CRS of the source, e.g. EPSG:32643; defaults to the file's own")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes for reprojection and validation")
+    args = parser.parse_args()
+
+    success = process_and_store_data(args.source, args.table, args.chunk_size, args.crs, args.workers)
+    if success:
+        print("Data ingestion completed successfully")
+
+        # Verify the data
+        try:
+            engine = create_db_engine()
+            with engine.connect() as connection:
+                result = connection.execute(text(f"SELECT COUNT(*) FROM {quote_identifier(args.table)}")).fetchone()
+                print(f"Verified {result[0]} records in the {args.table} table")
+        except Exception as e:
+            print(f"Error verifying data: {str(e)}")
+    else:
+        print("Data ingestion failed")
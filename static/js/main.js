@@ -1,6 +1,8 @@
 // State management
 let currentPage = 0;
 const pageSize = 50;
+// Keyset cursors for each page we have seen; page 0 starts with no cursor
+const pageCursors = [null];
 let selectedFeatureId = null;
 
 // DOM Elements
@@ -71,7 +73,13 @@ function showFeatureInfo(e) {
 async function loadFeatures(page = 0) {
     try {
         console.log(`Fetching features: page=${page}, pageSize=${pageSize}`);
-        const response = await fetch(`/api/features/?limit=${pageSize}&offset=${page * pageSize}`);
+        // Prefer the cursor for pages we've reached before, fall back to offset
+        const cursor = pageCursors[page];
+        const pageQuery = cursor
+            ? `cursor=${encodeURIComponent(cursor)}`
+            : `offset=${page * pageSize}`;
+        // Ask for geometry simplified to the current zoom level
+        const response = await fetch(`/api/features/?limit=${pageSize}&${pageQuery}&zoom=${map.getZoom()}`);
         
         console.log('Response status:', response.status);
         console.log('Response headers:', Object.fromEntries(response.headers.entries()));
@@ -84,58 +92,93 @@ async function loadFeatures(page = 0) {
         
         const data = await response.json();
         console.log('Received features:', data);
-        
-        // Clear existing features
-        featureList.innerHTML = '';
-        featuresLayer.clearLayers();
-
-        // Populate feature list and map
-        data.forEach(feature => {
-            // Create feature card
-            const featureCard = document.createElement('div');
-            featureCard.className = 'feature-card';
-            featureCard.innerHTML = `
-                <h6>${feature.name}</h6>
-                <small>${feature.description || 'No description'}</small>
-            `;
-            featureCard.addEventListener('click', () => selectFeature(feature));
-            featureList.appendChild(featureCard);
-
-            // Add to map
-            const geoJsonFeature = {
-                type: 'Feature',
-                properties: feature,
-                geometry: feature.geometry
-            };
-            featuresLayer.addData(geoJsonFeature);
-        });
-
-        // Fit map to features
-        if (data.length > 0) {
-            map.fitBounds(featuresLayer.getBounds());
-        }
-
+        pageCursors[page + 1] = response.headers.get('X-Next-Cursor');
+        renderFeatures(data);
         currentPage = page;
     } catch (error) {
-        console.error('Complete error details:', error);
-        featureList.innerHTML = `
-            <div class="alert alert-danger">
-                Error loading features: ${error.message}
-                <details>${error.stack}</details>
-            </div>
+        showLoadError(error);
+    }
+}
+
+// Replace the feature list and map contents with these features
+function renderFeatures(data) {
+    // Clear existing features
+    featureList.innerHTML = '';
+    featuresLayer.clearLayers();
+
+    // Populate feature list and map
+    data.forEach(feature => {
+        // Create feature card
+        const featureCard = document.createElement('div');
+        featureCard.className = 'feature-card';
+        featureCard.innerHTML = `
+            <h6>${feature.name}</h6>
+            <small>${feature.description || 'No description'}</small>
         `;
+        featureCard.addEventListener('click', () => selectFeature(feature));
+        featureList.appendChild(featureCard);
+
+        // Add to map
+        const geoJsonFeature = {
+            type: 'Feature',
+            properties: feature,
+            geometry: feature.geometry
+        };
+        featuresLayer.addData(geoJsonFeature);
+    });
+
+    // Fit map to features
+    if (data.length > 0) {
+        map.fitBounds(featuresLayer.getBounds());
+    }
+}
+
+function showLoadError(error) {
+    console.error('Complete error details:', error);
+    featureList.innerHTML = `
+        <div class="alert alert-danger">
+            Error loading features: ${error.message}
+            <details>${error.stack}</details>
+        </div>
+    `;
+}
+
+// Search functionality: ranked server-side search over names and
+// descriptions, sent once typing pauses; an empty box shows the page again
+let searchTimer = null;
+let searchSequence = 0;
+
+async function searchFeatures(searchTerm) {
+    // Responses can arrive out of order; only render the latest search
+    const sequence = ++searchSequence;
+    try {
+        const response = await fetch(
+            `/api/features/search?q=${encodeURIComponent(searchTerm)}&limit=${pageSize}&zoom=${map.getZoom()}`
+        );
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`HTTP error! status: ${response.status}, message: ${errorText}`);
+        }
+        const data = await response.json();
+        if (sequence === searchSequence) {
+            renderFeatures(data);
+        }
+    } catch (error) {
+        showLoadError(error);
     }
 }
 
-// Search functionality
 searchInput.addEventListener('input', (e) => {
-    const searchTerm = e.target.value.toLowerCase();
-    const featureCards = document.querySelectorAll('.feature-card');
-    
-    featureCards.forEach(card => {
-        const text = card.textContent.toLowerCase();
-        card.style.display = text.includes(searchTerm) ? 'block' : 'none';
-    });
+    const searchTerm = e.target.value.trim();
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        if (searchTerm) {
+            searchFeatures(searchTerm);
+        } else {
+            searchSequence++;
+            loadFeatures(currentPage);
+        }
+    }, 250);
 });
 
 // Map control functions
@@ -149,10 +192,9 @@ fitBoundsBtn.addEventListener('click', () => {
     ]);
 });
 
-function selectFeature(feature) {
+async function selectFeature(feature) {
     selectedFeatureId = feature.id;
     featureName.value = feature.name;
-    featureGeometry.value = JSON.stringify(feature.geometry, null, 2);
     deleteFeatureBtn.style.display = 'inline-block';
     
     // Highlight selected feature
@@ -166,6 +208,27 @@ function selectFeature(feature) {
             featuresLayer.resetStyle(layer);
         }
     });
+
+    // List and search results carry geometry simplified for the map; saving
+    // that back would overwrite the stored geometry, so the editor gets the
+    // full-resolution feature instead
+    featureGeometry.value = '';
+    saveFeatureBtn.disabled = true;
+    try {
+        const response = await fetch(`/api/features/${feature.id}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const fullFeature = await response.json();
+        // Another feature may have been selected while this one loaded
+        if (selectedFeatureId === feature.id) {
+            featureGeometry.value = JSON.stringify(fullFeature.geometry, null, 2);
+            saveFeatureBtn.disabled = false;
+        }
+    } catch (error) {
+        console.error('Error loading feature:', error);
+        alert(`Error: ${error.message}`);
+    }
 }
 
 async function handleFeatureSubmit(e) {
@@ -221,6 +284,7 @@ async function handleFeatureDelete() {
 
 function clearForm() {
     selectedFeatureId = null;
+    saveFeatureBtn.disabled = false;
     featureName.value = '';
     featureGeometry.value = '';
     deleteFeatureBtn.style.display = 'none';
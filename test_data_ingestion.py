@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrips"))
+
+import data_ingestion
+from FastAPI.serialization import iter_feature_collection
+
+
+def point_feature(i, x=75.0, y=13.0, **properties):
+    return {
+        "type": "Feature",
+        "properties": {"name": f"feature {i}", **properties},
+        "geometry": {"type": "Point", "coordinates": [x + i, y]},
+    }
+
+
+def write_collection(path, features, **members):
+    # Members go first, as they do in most files
+    path.write_text(json.dumps({"type": "FeatureCollection", **members, "features": features}), encoding="utf-8")
+    return str(path)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def copy_expert(self, sql, file):
+        self.connection.copies.append((sql, file.read()))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Records the statements and COPYs PostGISWriter sends."""
+
+    def __init__(self):
+        self.statements = []
+        self.copies = []
+        self.connection = self
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_open_geojson_reads_local_file(tmp_path):
+    path = write_collection(tmp_path / "points.geojson", [point_feature(0)])
+    with data_ingestion.open_geojson(path) as stream:
+        features = list(iter_feature_collection(stream))
+    assert features == [point_feature(0)]
+
+
+def test_iter_feature_collection_reports_members(tmp_path):
+    crs = {"type": "name", "properties": {"name": "EPSG:32643"}}
+    path = write_collection(tmp_path / "utm.geojson", [point_feature(0), point_feature(1)], name="utm", crs=crs)
+    members = {}
+    with open(path, encoding="utf-8") as stream:
+        features = list(iter_feature_collection(stream, members=members))
+    assert len(features) == 2
+    assert members == {"type": "FeatureCollection", "name": "utm", "crs": crs}
+    assert data_ingestion.declared_crs(members) == "EPSG:32643"
+
+
+def test_iter_feature_collection_across_read_boundaries(tmp_path):
+    features = [point_feature(i, label="a, \"quoted\" } value") for i in range(20)]
+    path = write_collection(tmp_path / "points.geojson", features)
+    # Reads far smaller than a feature split values and strings everywhere
+    for read_size in (1, 7, 64):
+        with open(path, encoding="utf-8") as stream:
+            assert list(iter_feature_collection(stream, read_size=read_size)) == features
+
+
+@pytest.mark.parametrize("count, sizes", [(5, [2, 2, 1]), (4, [2, 2]), (1, [1]), (0, [])])
+def test_iter_source_chunks_boundaries(tmp_path, count, sizes):
+    features = [point_feature(i) for i in range(count)]
+    path = write_collection(tmp_path / "points.geojson", features)
+    with open(path, encoding="utf-8") as stream:
+        chunks = list(data_ingestion.iter_source_chunks(stream, 2))
+    assert [len(chunk) for chunk, _ in chunks] == sizes
+    assert [f for chunk, _ in chunks for f in chunk] == features
+
+
+def test_iter_source_chunks_crs(tmp_path):
+    features = [point_feature(i) for i in range(3)]
+    declared = {"type": "name", "properties": {"name": "EPSG:3857"}}
+
+    def source_crs(path, crs=None):
+        with open(path, encoding="utf-8") as stream:
+            return {c for _, c in data_ingestion.iter_source_chunks(stream, 2, crs)}
+
+    assert source_crs(write_collection(tmp_path / "plain.geojson", features)) == {"EPSG:4326"}
+    declaring = write_collection(tmp_path / "declared.geojson", features, crs=declared)
+    assert source_crs(declaring) == {"EPSG:3857"}
+    assert source_crs(declaring, crs="EPSG:32643") == {"EPSG:32643"}
+
+
+def test_iter_source_chunks_crs_after_features(tmp_path):
+    def late_crs(count):
+        path = tmp_path / f"late{count}.geojson"
+        path.write_text(json.dumps({
+            "type": "FeatureCollection",
+            "features": [point_feature(i) for i in range(count)],
+            "crs": {"type": "name", "properties": {"name": "EPSG:3857"}},
+        }), encoding="utf-8")
+        return path
+
+    # Fewer features than a chunk: the member is read before the chunk is handed out
+    with open(late_crs(1), encoding="utf-8") as stream:
+        assert [c for _, c in data_ingestion.iter_source_chunks(stream, 2)] == ["EPSG:3857"]
+    # A chunk already went out in EPSG:4326
+    with open(late_crs(3), encoding="utf-8") as stream:
+        with pytest.raises(ValueError, match="after its features"):
+            list(data_ingestion.iter_source_chunks(stream, 2))
+    # Named explicitly, the file's own member is not needed
+    with open(late_crs(3), encoding="utf-8") as stream:
+        assert len(list(data_ingestion.iter_source_chunks(stream, 2, crs="EPSG:3857"))) == 2
+
+
+def test_prepare_chunk_reprojects_to_wgs84():
+    # EPSG:3857 metres of 75E 13N
+    feature = {"type": "Feature", "properties": {"name": "a"},
+               "geometry": {"type": "Point", "coordinates": [8348961.81, 1459732.62]}}
+    chunk = data_ingestion.prepare_chunk([feature], "EPSG:3857")
+    row = next(csv.reader(io.StringIO(chunk.csv)))
+    min_x, min_y = float(row[1]), float(row[2])
+    assert min_x == pytest.approx(75.0, abs=1e-4)
+    assert min_y == pytest.approx(13.0, abs=1e-4)
+
+
+def test_prepare_chunk_nulls_and_types():
+    features = [point_feature(0, population=10, area=1.5), point_feature(1, population=None, area=None)]
+    chunk = data_ingestion.prepare_chunk(features, "EPSG:4326")
+    assert chunk.count == 2
+    assert chunk.columns == {"name": "text", "population": "double precision", "area": "double precision"}
+    rows = list(csv.reader(io.StringIO(chunk.csv)))
+    # Whole floats load into bigint columns too; missing values are NULL
+    assert rows[0][:3] == ["feature 0", "10", "1.5"]
+    assert rows[1][:3] == ["feature 1", r"\N", r"\N"]
+
+
+def test_writer_adds_columns_first_seen_in_later_chunk(tmp_path):
+    features = [point_feature(0), point_feature(1), point_feature(2, district="Mysuru")]
+    path = write_collection(tmp_path / "points.geojson", features)
+    connection = FakeConnection()
+    writer = data_ingestion.PostGISWriter(connection, "places")
+    with open(path, encoding="utf-8") as stream:
+        for chunk in data_ingestion.iter_prepared(data_ingestion.iter_source_chunks(stream, 2), workers=1):
+            writer.write(chunk)
+
+    assert list(writer.columns) == ["name", "district"]
+    assert 'CREATE TABLE "places" ("name" text' in connection.statements[1]
+    assert connection.statements[2:] == ['ALTER TABLE "places" ADD COLUMN "district" text']
+    # Each COPY names only the columns its own chunk has
+    (first_sql, first_csv), (second_sql, second_csv) = connection.copies
+    assert '"district"' not in first_sql
+    assert '("name", "district", min_x' in second_sql
+    assert next(csv.reader(io.StringIO(second_csv)))[:2] == ["feature 2", "Mysuru"]
+    assert "NULL '\\N'" in first_sql